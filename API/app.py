@@ -1,16 +1,34 @@
-import uvicorn
-from fastapi import FastAPI
-import pandas as pd
-import mlflow
+# Only what the root and health endpoints need is imported here:
+# the inference stack (mlflow, pandas, numpy, sklearn) is imported
+# by the model holder, in the background, once the server is up.
+from fastapi import FastAPI, HTTPException, UploadFile, File, Request
 from pydantic import BaseModel
-import os
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from enum  import Enum
+from typing import List
+
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+
+from model_holder import ModelHolder, MODEL_REFRESH_SECONDS
+from batch import FEATURE_COLUMNS, MAX_BATCH_SIZE, features_to_frame, read_upload, stream_predictions, validate_rows
+from batching import MicroBatcher
+from cache import PredictionCache, feature_key
+from logging_setup import request_id_var, sample_payload, setup_logging
+from metrics import registry, Gauge, REQUESTS, REQUEST_LATENCY, PREDICTION_ERRORS, STAGE_LATENCY, BATCH_SIZE
 
 
-# Load environment variables from .env
+# Load environment variables from .env (MLFLOW_TRACKING_URI is read by mlflow)
 load_dotenv()
-mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+
+# Structured logs written to stdout by a background thread
+log_handler, log_listener = setup_logging()
+logger = logging.getLogger("api")
 
 description = """
     This API is used to support the features_df Science team's pricing optimization efforts,
@@ -111,6 +129,94 @@ class PredictionFeatures(BaseModel):
     has_speed_regulator: bool
     winter_tires: bool
 
+# ---------------- Model loaded once at startup ----------------
+model_holder = ModelHolder()
+
+# Stages of a prediction, timed for /metrics.
+# The served version is read once, so a batch is encoded and predicted
+# by the same version even if a new one is swapped in meanwhile.
+def encode_features(features_list, endpoint="/predict"):
+    BATCH_SIZE.observe(len(features_list), endpoint=endpoint)
+    loaded = model_holder.current
+    with STAGE_LATENCY.time(stage="encode"):
+        return loaded, loaded.encode_features(features_list)
+
+def encode_frame(features_list, endpoint):
+    BATCH_SIZE.observe(len(features_list), endpoint=endpoint)
+    loaded = model_holder.current
+    with STAGE_LATENCY.time(stage="dataframe"):
+        data = features_to_frame(features_list)
+    with STAGE_LATENCY.time(stage="encode"):
+        return loaded, loaded.encode_frame(data)
+
+def predict_encoded(encoded):
+    loaded, input_data = encoded
+    with STAGE_LATENCY.time(stage="inference"):
+        return loaded.predict(input_data)
+
+def timed_stream(chunks):
+    # Time spent writing the JSON of the streamed predictions
+    start_time = time.perf_counter()
+    elapsed = 0.0
+    for chunk in chunks:
+        elapsed += time.perf_counter() - start_time
+        yield chunk
+        start_time = time.perf_counter()
+    STAGE_LATENCY.observe(elapsed + time.perf_counter() - start_time, stage="serialization")
+
+# Concurrent /predict calls are predicted together,
+# encoded straight into a NumPy array
+batcher = MicroBatcher(encode_features, predict_encoded)
+
+# Identical cars are predicted once per model version
+prediction_cache = PredictionCache()
+
+# State of the API read when /metrics is scraped
+registry.register(Gauge("api_model_ready", "1 once the model is loaded.", lambda: int(model_holder.ready)))
+registry.register(Gauge("api_cache_hits_total", "Predictions served from the cache.", lambda: prediction_cache.hits, "counter"))
+registry.register(Gauge("api_cache_misses_total", "Predictions not found in the cache.", lambda: prediction_cache.misses, "counter"))
+registry.register(Gauge("api_cache_hit_ratio", "Share of predictions served from the cache.", lambda: prediction_cache.stats()["hit_rate"]))
+registry.register(Gauge("api_cache_entries", "Predictions in the cache.", lambda: prediction_cache.stats()["entries"]))
+registry.register(Gauge("api_log_records_dropped_total", "Log records dropped because the log queue was full.", lambda: log_handler.dropped, "counter"))
+
+# Load the model, then look for a new version, in the background
+async def manage_model():
+    logger.info("Loading model", extra={"source": model_holder.source})
+    try:
+        await asyncio.to_thread(model_holder.load)
+        STAGE_LATENCY.observe(model_holder.load_time, stage="model_load")
+        logger.info("Model loaded", extra={
+            "model_version": model_holder.version,
+            "loaded_from": model_holder.loaded_from,
+            "load_time": model_holder.load_time,
+        })
+    except Exception:
+        # Keep the API up: /ready reports the failure and /predict returns 503
+        logger.exception("Error while loading model")
+
+    while MODEL_REFRESH_SECONDS > 0:
+        await asyncio.sleep(MODEL_REFRESH_SECONDS)
+        try:
+            if await asyncio.to_thread(model_holder.refresh):
+                STAGE_LATENCY.observe(model_holder.load_time, stage="model_load")
+                logger.info("Model updated", extra={"model_version": model_holder.version, "load_time": model_holder.load_time})
+        except Exception:
+            # Keep serving the current version
+            logger.exception("Error while refreshing model")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    log_listener.start()
+    await batcher.start()
+
+    # The server binds right away, /ready turns green once the model is loaded
+    model_task = asyncio.create_task(manage_model())
+    yield
+    model_task.cancel()
+    await batcher.stop()
+    # Write the remaining records before exiting
+    log_listener.stop()
+
 # ---------------- FastAPI app ----------------
 app = FastAPI(
     title = "Car Price Prediction API",
@@ -118,9 +224,39 @@ app = FastAPI(
     version = "1.0.0",
     contact = {
         "name": "Andriana's Team",
-    }
+    },
+    lifespan = lifespan,
 )
 
+# ---------------- Request id ----------------
+@app.middleware("http")
+async def request_id_middleware(request: Request, call_next):
+    # Reuse the id of the caller if any, so logs can be matched across services
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        response = await call_next(request)
+    finally:
+        request_id_var.reset(token)
+    response.headers["X-Request-ID"] = request_id
+    return response
+
+# ---------------- Request metrics ----------------
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    start_time = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Route template (not the raw path) to keep the number of series bounded
+        route = request.scope.get("route")
+        path = route.path if route is not None else "unmatched"
+        REQUESTS.inc(method=request.method, path=path, status=status)
+        REQUEST_LATENCY.observe(time.perf_counter() - start_time, method=request.method, path=path)
+
 """
     Endpoint for making predictions /predict
 """
@@ -129,48 +265,133 @@ app = FastAPI(
 async def root():
     return {"message": "Welcome to the Car Price Prediction API"}
 
+# ---------------- Readiness endpoint ----------------
+@app.get("/ready")
+async def ready():
+    """
+        Ready only once the model is resident in memory.
+    """
+    status = model_holder.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+# ---------------- Stats endpoint ----------------
+@app.get("/stats")
+async def stats():
+    """
+        Hit/miss counters of the prediction cache.
+    """
+    return {"cache": prediction_cache.stats()}
+
+# ---------------- Metrics endpoint ----------------
+@app.get("/metrics")
+async def metrics():
+    """
+        Counters and latency histograms in the Prometheus text format.
+    """
+    return Response(registry.render(), media_type=registry.content_type)
+
 # ---------------- Prediction endpoint ----------------
 @app.post("/predict", tags=["Prediction"])
 async def predict(features: PredictionFeatures):
     """
         Predict the price of a car based on the provided features.
     """
-    try:
-        # Prepare the input data for prediction
-        # input_data = pd.DataFrame([features.dict()])
-        input_data = pd.DataFrame([features.model_dump()])
-        print("Input data:", input_data)
+    if not model_holder.ready:
+        raise HTTPException(status_code=503, detail="Model is not loaded yet")
 
-        # Load the model
-        # logged_model = 'runs:/a1388f05f64c4da0b491f886cdab93b1/model'
-        logged_model = 'runs:/4943284e50ec4d0c986a1379bb48023a/model'
-        print("Loading model from: ", logged_model)
+    log_payload = sample_payload()
+    try:
+        if log_payload:
+            logger.info("Input data", extra={"features": features.model_dump(mode="json")})
 
-        # Load model as a PyFuncModel.
-        loaded_model = mlflow.pyfunc.load_model(logged_model)
-        print("Model loaded successfully")
+        # Same car already predicted by the served model
+        key = feature_key(features, FEATURE_COLUMNS)
+        version = model_holder.version
+        prediction = prediction_cache.get(version, key)
+        if prediction is not None:
+            return {"predicted_price": prediction}
 
-        # Make prediction
-        prediction = loaded_model.predict(pd.DataFrame(input_data))
-        print("Prediction result:", prediction)
+        # Make prediction with the model kept in memory,
+        # batched with the other requests received at the same time
+        prediction = float(await batcher.submit(features))
+        if log_payload:
+            logger.info("Prediction result", extra={"predicted_price": prediction})
+        # Not cached if another version was swapped in meanwhile
+        if model_holder.version == version:
+            prediction_cache.put(version, key, prediction)
 
         # Return prediction
-        return {"predicted_price": float(prediction[0])}
+        return {"predicted_price": prediction}
 
     except Exception as e:
-        print("Error during prediction:", e)
+        logger.exception("Error during prediction")
+        PREDICTION_ERRORS.inc(endpoint="/predict")
         return {"error": str(e)}
 
+# ---------------- Batch prediction endpoints ----------------
+def check_batch(size):
+    if not model_holder.ready:
+        raise HTTPException(status_code=503, detail="Model is not loaded yet")
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Empty batch")
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch size {size} exceeds the maximum of {MAX_BATCH_SIZE}")
+
+@app.post("/predict/batch", tags=["Prediction"])
+async def predict_batch(features_list: List[PredictionFeatures]):
+    """
+        Predict the prices of many cars in one call.
+        The predictions are returned in the same order as the input.
+    """
+    check_batch(len(features_list))
+
+    # One columnar frame and one vectorized prediction for the whole batch
+    try:
+        input_data = encode_frame(features_list, "/predict/batch")
+        prediction = await asyncio.to_thread(predict_encoded, input_data)
+    except Exception:
+        PREDICTION_ERRORS.inc(endpoint="/predict/batch")
+        raise
+    return StreamingResponse(timed_stream(stream_predictions(prediction)), media_type="application/json")
+
+@app.post("/predict/batch/file", tags=["Prediction"])
+async def predict_batch_file(file: UploadFile = File(...)):
+    """
+        Predict the prices of the cars of a CSV or Parquet file
+        with the same columns as get_around_pricing_project.csv.
+    """
+    try:
+        input_data = read_upload(file.filename, await file.read())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    check_batch(len(input_data))
+
+    # Same checks as the JSON endpoints, every offending row is reported
+    features_list, errors = validate_rows(input_data, PredictionFeatures)
+    if errors:
+        raise RequestValidationError(errors)
+
+    try:
+        input_data = encode_frame(features_list, "/predict/batch/file")
+        prediction = await asyncio.to_thread(predict_encoded, input_data)
+    except Exception:
+        PREDICTION_ERRORS.inc(endpoint="/predict/batch/file")
+        raise
+    return StreamingResponse(timed_stream(stream_predictions(prediction)), media_type="application/json")
+
 # ---------------- Error handling ----------------
-from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
 from fastapi.encoders import jsonable_encoder
-from fastapi import Request
 from starlette.status import HTTP_422_UNPROCESSABLE_ENTITY
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
-    print(f"Validation error on request: {await request.body()}")
+    # The body is only logged for sampled requests, the errors always
+    extra = {"path": request.url.path, "errors": jsonable_encoder(exc.errors())}
+    if sample_payload():
+        extra["body"] = jsonable_encoder(exc.body)
+    logger.warning("Validation error on request", extra=extra)
     return JSONResponse(
         status_code=HTTP_422_UNPROCESSABLE_ENTITY,
         content=jsonable_encoder({
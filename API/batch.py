@@ -0,0 +1,119 @@
+import io
+import json
+import os
+
+
+# Same column layout (and order) as get_around_pricing_project.csv without the target
+FEATURE_COLUMNS = [
+    "model_key",
+    "mileage",
+    "engine_power",
+    "fuel",
+    "paint_color",
+    "car_type",
+    "private_parking_available",
+    "has_gps",
+    "has_air_conditioning",
+    "automatic_car",
+    "has_getaround_connect",
+    "has_speed_regulator",
+    "winter_tires",
+]
+
+# Maximum number of rows accepted by the batch endpoints
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+
+# Number of predictions written per chunk of the streamed response
+STREAM_CHUNK_SIZE = 1000
+
+# Values accepted in the boolean columns of an uploaded file
+BOOLEAN_VALUES = {True: True, False: False, "True": True, "False": False, "true": True, "false": False}
+
+
+# ---------------- Build the input frame ----------------
+def features_to_frame(features_list):
+    """
+        Build one columnar DataFrame from a list of PredictionFeatures.
+    """
+    import pandas as pd
+
+    columns = {}
+    for column in FEATURE_COLUMNS:
+        values = [getattr(features, column) for features in features_list]
+        # Enums are sent to the model as their raw string value
+        if values and hasattr(values[0], "value"):
+            values = [value.value for value in values]
+        columns[column] = values
+    return pd.DataFrame(columns, columns=FEATURE_COLUMNS)
+
+
+def read_upload(filename, content):
+    """
+        Read an uploaded CSV or Parquet file with the layout of get_around_pricing_project.csv.
+    """
+    import pandas as pd
+
+    if filename.lower().endswith(".parquet"):
+        data = pd.read_parquet(io.BytesIO(content))
+    elif filename.lower().endswith(".csv"):
+        data = pd.read_csv(io.BytesIO(content))
+    else:
+        raise ValueError("Only .csv and .parquet files are supported")
+
+    missing_columns = [column for column in FEATURE_COLUMNS if column not in data.columns]
+    if missing_columns:
+        raise ValueError(f"Missing columns: {', '.join(missing_columns)}")
+
+    # Drop the index column and the target if present, keep the training order
+    return data[FEATURE_COLUMNS]
+
+
+def validate_rows(data, schema):
+    """
+        Check every row of an uploaded file against the schema of the JSON
+        endpoints (known categories, integers, booleans written True or False).
+        Returns the validated rows and the errors, located by row and column.
+    """
+    from pydantic import ValidationError
+
+    boolean_columns = [column for column, field in schema.model_fields.items() if field.annotation is bool]
+    features_list = []
+    errors = []
+    for row, record in enumerate(data.to_dict(orient="records")):
+        row_errors = []
+        for column in boolean_columns:
+            value = record[column]
+            record[column] = BOOLEAN_VALUES.get(value) if isinstance(value, (bool, str)) else None
+            if record[column] is None:
+                row_errors.append({
+                    "type": "bool_type", "loc": (column,), "input": value,
+                    "msg": "Input should be a valid boolean, True or False",
+                })
+        try:
+            features = schema.model_validate(record)
+        except ValidationError as e:
+            # A boolean column already reported is not reported twice
+            reported = {error["loc"] for error in row_errors}
+            row_errors.extend(error for error in e.errors(include_url=False) if error["loc"] not in reported)
+        if row_errors:
+            # Empty cells are read as NaN, reported as null
+            errors.extend(
+                dict(error, loc=("file", row) + tuple(error["loc"]), input=None if error["input"] != error["input"] else error["input"])
+                for error in row_errors
+            )
+        else:
+            features_list.append(features)
+    return features_list, errors
+
+
+# ---------------- Stream the predictions ----------------
+def stream_predictions(predictions):
+    """
+        Yield the predictions as a JSON document, chunk by chunk, in input order.
+    """
+    yield '{"predicted_prices": ['
+    for start in range(0, len(predictions), STREAM_CHUNK_SIZE):
+        chunk = [float(prediction) for prediction in predictions[start:start + STREAM_CHUNK_SIZE]]
+        separator = "," if start else ""
+        yield separator + json.dumps(chunk)[1:-1]
+    yield "]}"
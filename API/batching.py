@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+
+# Maximum number of requests predicted together
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "64"))
+
+# Maximum time (in milliseconds) a request waits for others before being predicted
+BATCH_MAX_WAIT_MS = float(os.getenv("BATCH_MAX_WAIT_MS", "5"))
+
+# ---------------- Micro-batching scheduler ----------------
+class MicroBatcher:
+    """
+        Coalesces concurrent single predictions into one batched prediction.
+
+        Requests are queued for at most max_wait_ms (or until max_batch_size
+        requests are waiting), then build_fn turns the queued items into one
+        input and predict_fn runs once, in a worker thread so the event loop
+        keeps accepting requests. Each request gets its own result back.
+    """
+
+    def __init__(self, build_fn, predict_fn, max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS):
+        self.build_fn = build_fn
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue = None
+        self._task = None
+
+    async def start(self):
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def submit(self, item):
+        """
+            Queue one item and wait for its prediction.
+        """
+        if self._task is None:
+            raise RuntimeError("Batcher is not started")
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future))
+        return await future
+
+    async def _collect(self):
+        # Wait for the first request, then for the others until the deadline
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            # Skip requests whose client already went away
+            batch = [(item, future) for item, future in batch if not future.done()]
+            if not batch:
+                continue
+            try:
+                input_data = self.build_fn([item for item, _ in batch])
+                predictions = await asyncio.to_thread(self.predict_fn, input_data)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
@@ -0,0 +1,232 @@
+"""
+    Load test of the prediction API: throughput and latency percentiles.
+
+    Replays payloads (a JSON lines file of features and/or rows sampled from
+    get_around_pricing_project.csv) against the app, either in-process or over
+    a local uvicorn, at one or more concurrency levels, and stores the results
+    as JSON in benchmarks/results so runs can be compared across commits.
+
+    Usage (from the API folder):
+        python benchmarks/bench_api.py --mode inprocess --concurrency 1,8,32
+        python benchmarks/bench_api.py --mode uvicorn --requests 5000 --no-cache
+        python benchmarks/bench_api.py --compare results/a.json results/b.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import httpx
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(API_DIR, "benchmarks", "results")
+sys.path.insert(0, API_DIR)
+
+from batch import FEATURE_COLUMNS
+
+
+# ---------------- Payloads ----------------
+def load_payloads(payloads_path, csv_path, sample, seed):
+    payloads = []
+    if payloads_path:
+        with open(payloads_path, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    payloads.append(json.loads(line))
+    if csv_path and sample > 0:
+        data = pd.read_csv(csv_path, index_col=0)[FEATURE_COLUMNS]
+        rows = data.sample(n=min(sample, len(data)), random_state=seed)
+        payloads.extend(json.loads(rows.to_json(orient="records", force_ascii=False)))
+    if not payloads:
+        raise SystemExit("No payloads: give --payloads and/or --csv")
+    return payloads
+
+
+# ---------------- Load generation ----------------
+async def run_level(client, endpoint, payloads, concurrency, total_requests):
+    latencies = []
+    errors = 0
+    next_request = 0
+
+    async def worker():
+        nonlocal next_request, errors
+        while next_request < total_requests:
+            payload = payloads[next_request % len(payloads)]
+            next_request += 1
+            start_time = time.perf_counter()
+            try:
+                response = await client.post(endpoint, json=payload)
+                if response.status_code != 200 or "error" in response.json():
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start_time)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start_time
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": errors,
+        "duration_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed,
+        "p50_ms": float(np.percentile(latencies_ms, 50)),
+        "p95_ms": float(np.percentile(latencies_ms, 95)),
+        "p99_ms": float(np.percentile(latencies_ms, 99)),
+        "max_ms": float(latencies_ms.max()),
+    }
+
+
+async def run_levels(client, args, payloads):
+    results = []
+    # Warm up (first requests, caches, connections)
+    await run_level(client, args.endpoint, payloads, 1, min(args.warmup, args.requests))
+    for concurrency in args.concurrency:
+        result = await run_level(client, args.endpoint, payloads, concurrency, args.requests)
+        print(
+            f"concurrency {concurrency:4d}: {result['throughput_rps']:8.1f} req/s   "
+            f"p50 {result['p50_ms']:7.2f} ms   p95 {result['p95_ms']:7.2f} ms   "
+            f"p99 {result['p99_ms']:7.2f} ms   errors {result['errors']}"
+        )
+        results.append(result)
+    return results
+
+
+async def run_inprocess(args, payloads):
+    import app
+
+    async with app.lifespan(app.app):
+        # The model is loaded in the background
+        while not app.model_holder.ready:
+            if app.model_holder.error:
+                raise SystemExit(f"Model not loaded: {app.model_holder.error}")
+            await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=app.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_levels(client, args, payloads)
+
+
+async def run_http(args, payloads, base_url):
+    limits = httpx.Limits(max_connections=max(args.concurrency), max_keepalive_connections=max(args.concurrency))
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        return await run_levels(client, args, payloads)
+
+
+def wait_ready(base_url, timeout):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"{base_url}/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"API not ready after {timeout}s")
+
+
+def run_uvicorn(args, payloads):
+    base_url = f"http://127.0.0.1:{args.port}"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(args.port), "--log-level", "warning"],
+        cwd=API_DIR,
+        env=os.environ.copy(),
+    )
+    try:
+        wait_ready(base_url, args.startup_timeout)
+        return asyncio.run(run_http(args, payloads, base_url))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+# ---------------- Results ----------------
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=API_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def save_results(args, results):
+    commit = git_commit()
+    report = {
+        "commit": commit,
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "mode": args.mode,
+        "endpoint": args.endpoint,
+        "config": {
+            key: os.getenv(key)
+            for key in ["MODEL_URI", "INFERENCE_ENGINE", "BATCH_MAX_SIZE", "BATCH_MAX_WAIT_MS", "CACHE_MAX_ENTRIES"]
+        },
+        "results": results,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = args.output or os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{commit}-{args.mode}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+def compare(before_path, after_path):
+    with open(before_path, encoding="utf-8") as f:
+        before = {result["concurrency"]: result for result in json.load(f)["results"]}
+    with open(after_path, encoding="utf-8") as f:
+        after = {result["concurrency"]: result for result in json.load(f)["results"]}
+    for concurrency in sorted(set(before) & set(after)):
+        line = [f"concurrency {concurrency:4d}:"]
+        for key in ["throughput_rps", "p50_ms", "p95_ms", "p99_ms"]:
+            change = (after[concurrency][key] / before[concurrency][key] - 1) * 100
+            line.append(f"{key} {before[concurrency][key]:.2f} -> {after[concurrency][key]:.2f} ({change:+.1f}%)")
+        print("   ".join(line))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=["inprocess", "uvicorn", "url"], default="inprocess")
+    parser.add_argument("--url", help="Base URL of a running API (with --mode url)")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--endpoint", default="/predict")
+    parser.add_argument("--payloads", help="JSON lines file, one features object per line")
+    parser.add_argument("--csv", default=os.path.join(API_DIR, "..", "mlflow", "get_around_pricing_project.csv"))
+    parser.add_argument("--sample", type=int, default=1000, help="Rows sampled from --csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", default="1,8,32,128", type=lambda value: [int(level) for level in value.split(",")])
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per concurrency level")
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--no-cache", action="store_true", help="Disable the prediction cache of the API")
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/<time>-<commit>-<mode>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two results files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    if args.no_cache:
+        os.environ["CACHE_MAX_ENTRIES"] = "0"
+    payloads = load_payloads(args.payloads, args.csv, args.sample, args.seed)
+    random.Random(args.seed).shuffle(payloads)
+
+    if args.mode == "inprocess":
+        results = asyncio.run(run_inprocess(args, payloads))
+    elif args.mode == "uvicorn":
+        results = run_uvicorn(args, payloads)
+    else:
+        if not args.url:
+            raise SystemExit("--mode url needs --url")
+        results = asyncio.run(run_http(args, payloads, args.url.rstrip("/")))
+    save_results(args, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+    Per-request cost of the single prediction path: pandas DataFrames against
+    the direct NumPy encoding, in latency and in memory allocations.
+
+    Usage (from the API folder):
+        python benchmarks/bench_encoding.py --model-uri models:/get_around_price_prediction/1
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+import mlflow.sklearn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import PredictionFeatures
+from batch import features_to_frame
+from encoding import FeatureEncoder
+from forest import FlatForestModel
+from model_holder import DEFAULT_MODEL_URI
+
+
+def measure(function, features_list, repeat):
+    # Latency
+    timings = []
+    for features in features_list[:repeat]:
+        start_time = time.perf_counter()
+        function(features)
+        timings.append(time.perf_counter() - start_time)
+
+    # Memory allocated by one call
+    tracemalloc.start()
+    function(features_list[0])
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return float(np.median(timings)), peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-uri", default=os.getenv("MODEL_URI", DEFAULT_MODEL_URI))
+    parser.add_argument("--data", default="../mlflow/get_around_pricing_project.csv")
+    parser.add_argument("--repeat", type=int, default=1000)
+    args = parser.parse_args()
+
+    pipeline = mlflow.sklearn.load_model(args.model_uri)
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    flat_model = FlatForestModel.from_pipeline(pipeline)
+
+    data = pd.read_csv(args.data, index_col=0).drop(columns="rental_price_per_day")
+    features_list = [PredictionFeatures(**row) for row in data.to_dict(orient="records")]
+
+    # Both encodings of the whole data must be byte-identical
+    encoded = encoder.encode_features(features_list)
+    if encoded.tobytes() != encoder.encode_frame(features_to_frame(features_list)).tobytes():
+        raise SystemExit("encode_features differs from encode_frame")
+    print(f"Same encoding on {len(features_list)} rows")
+
+    paths = {
+        # Former handler: DataFrame of the request, then DataFrame again for the model
+        "pandas (former)": lambda features: pd.DataFrame(pd.DataFrame([features.model_dump()])),
+        "pandas + lookup table": lambda features: encoder.encode_frame(features_to_frame([features])),
+        "numpy": lambda features: encoder.encode_features([features]),
+        "numpy + flat forest": lambda features: flat_model.predict(encoder.encode_features([features])),
+    }
+    for name, function in paths.items():
+        latency, peak = measure(function, features_list, args.repeat)
+        print(f"{name:24s} {latency * 1e6:9.1f} us   peak allocated {peak / 1024:8.1f} KiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+    Parity and latency of the flat forest against sklearn.
+
+    Usage (from the API folder):
+        python benchmarks/bench_forest.py --model-uri models:/get_around_price_prediction/1
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+import mlflow.sklearn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from encoding import FeatureEncoder
+from forest import FlatForestModel
+from model_holder import DEFAULT_MODEL_URI
+
+
+def median_latency(predict, X, repeat):
+    timings = []
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        predict(X)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-uri", default=os.getenv("MODEL_URI", DEFAULT_MODEL_URI))
+    parser.add_argument("--data", default="../mlflow/get_around_pricing_project.csv")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    pipeline = mlflow.sklearn.load_model(args.model_uri)
+    data = pd.read_csv(args.data, index_col=0)
+    X = FeatureEncoder.from_pipeline(pipeline).encode_frame(data)
+
+    sklearn_model = pipeline[1:]
+    flat_model = FlatForestModel.from_pipeline(pipeline)
+
+    # ---------------- Parity ----------------
+    expected = sklearn_model.predict(X)
+    predicted = flat_model.predict(X)
+    print(f"Rows: {len(X)}")
+    print(f"Identical predictions: {int((expected == predicted).sum())}/{len(X)}")
+    print(f"Max absolute difference: {np.abs(expected - predicted).max():.3e}")
+    if expected.tobytes() != predicted.tobytes():
+        raise SystemExit("The flat forest predictions differ from sklearn")
+
+    # ---------------- Latency ----------------
+    for name, rows in [("single row", X[:1]), (f"batch of {len(X)}", X)]:
+        repeat = args.repeat if len(rows) == 1 else max(args.repeat // 20, 3)
+        sklearn_time = median_latency(sklearn_model.predict, rows, repeat)
+        flat_time = median_latency(flat_model.predict, rows, repeat)
+        print(
+            f"{name}: sklearn {sklearn_time * 1000:.3f} ms, flat {flat_time * 1000:.3f} ms "
+            f"(x{sklearn_time / flat_time:.1f})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+    Startup time of the API: import-time profile, time until the server
+    answers (bind) and time until the model is ready.
+
+    Usage (from the API folder):
+        python benchmarks/bench_startup.py --runs 5
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+import httpx
+import numpy as np
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(API_DIR, "benchmarks"))
+
+from bench_api import RESULTS_DIR, git_commit
+
+
+def import_profile(top):
+    """
+        Import time of app (in seconds) and its slowest imports, from python -X importtime.
+    """
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=API_DIR, capture_output=True, text=True, check=True,
+    ).stderr
+    imports = []
+    for line in output.splitlines():
+        match = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)", line)
+        if match:
+            imports.append((match.group(4), int(match.group(2)) / 1e6, len(match.group(3))))
+    position = max(index for index, (name, _, _) in enumerate(imports) if name == "app")
+    _, total, indent = imports[position]
+    # Direct imports of app: listed just before it, one level (2 spaces) deeper
+    direct = []
+    for item in reversed(imports[:position]):
+        if item[2] <= indent:
+            break
+        if item[2] == indent + 2:
+            direct.append(item)
+    direct.sort(key=lambda item: item[1], reverse=True)
+    return total, [(name, cumulative) for name, cumulative, _ in direct[:top]]
+
+
+def wait_for(url, timeout, start_time):
+    while time.perf_counter() - start_time < timeout:
+        try:
+            if httpx.get(url, timeout=1).status_code == 200:
+                return time.perf_counter() - start_time
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    return None
+
+
+def startup_times(port, timeout):
+    base_url = f"http://127.0.0.1:{port}"
+    start_time = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=API_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        bind_time = wait_for(f"{base_url}/", timeout, start_time)
+        ready_time = wait_for(f"{base_url}/ready", timeout, start_time)
+    finally:
+        server.terminate()
+        server.wait()
+    return bind_time, ready_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--port", type=int, default=8767)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=120)
+    args = parser.parse_args()
+
+    total, slowest = import_profile(args.top)
+    print(f"import app: {total * 1000:.0f} ms")
+    for name, cumulative in slowest:
+        print(f"    {name:30s} {cumulative * 1000:8.1f} ms")
+
+    bind_times, ready_times = [], []
+    for _ in range(args.runs):
+        bind_time, ready_time = startup_times(args.port, args.timeout)
+        bind_times.append(bind_time)
+        ready_times.append(ready_time)
+        print(f"bind {bind_time if bind_time is None else round(bind_time, 3)} s   ready {ready_time if ready_time is None else round(ready_time, 3)} s")
+
+    def median(values):
+        values = [value for value in values if value is not None]
+        return float(np.median(values)) if values else None
+
+    report = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {key: os.getenv(key) for key in ["MODEL_URI", "MODEL_NAME", "INFERENCE_ENGINE", "MODEL_OFFLINE_START"]},
+        "import_s": total,
+        "slowest_imports": dict(slowest),
+        "bind_s": median(bind_times),
+        "ready_s": median(ready_times),
+        "runs": args.runs,
+    }
+    print(f"median: bind {report['bind_s']} s, ready {report['ready_s']} s")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{report['commit']}-startup.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
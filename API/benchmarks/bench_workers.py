@@ -0,0 +1,98 @@
+"""
+    Memory and throughput of the API at 1, 2, 4 and 8 workers.
+
+    Starts serve.py with WORKERS=N for each N, loads it with bench_api and
+    reads the memory of the whole process tree: RSS counts shared pages once
+    per process, PSS splits them between the processes that share them, so
+    PSS shows what the workers really cost.
+
+    Usage (from the API folder):
+        INFERENCE_ENGINE=flat python benchmarks/bench_workers.py --workers 1,2,4,8
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(API_DIR, "benchmarks"))
+
+from bench_api import RESULTS_DIR, git_commit, load_payloads, run_http, wait_ready
+
+
+def process_tree(pid):
+    pids = [pid]
+    for current in pids:
+        for task in os.listdir(f"/proc/{current}/task"):
+            with open(f"/proc/{current}/task/{task}/children") as f:
+                pids.extend(int(child) for child in f.read().split())
+    return pids
+
+
+def memory_mb(pids):
+    """
+        RSS and PSS (in MB) summed over the processes.
+    """
+    totals = {"Rss": 0, "Pss": 0}
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/smaps_rollup") as f:
+                for line in f:
+                    key, value = line.split(":", 1)
+                    if key in totals:
+                        totals[key] += int(value.split()[0])
+        except FileNotFoundError:
+            continue
+    return totals["Rss"] / 1024, totals["Pss"] / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4,8", type=lambda value: [int(n) for n in value.split(",")])
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--endpoint", default="/predict")
+    parser.add_argument("--csv", default=os.path.join(API_DIR, "..", "mlflow", "get_around_pricing_project.csv"))
+    parser.add_argument("--sample", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--warmup", type=int, default=100)
+    parser.add_argument("--startup-timeout", type=float, default=180)
+    args = parser.parse_args()
+
+    payloads = load_payloads(None, args.csv, args.sample, 42)
+    base_url = f"http://127.0.0.1:{args.port}"
+    results = []
+    for workers in args.workers:
+        env = dict(os.environ, WORKERS=str(workers), PORT=str(args.port), HOST="127.0.0.1", CACHE_MAX_ENTRIES="0")
+        server = subprocess.Popen([sys.executable, "serve.py"], cwd=API_DIR, env=env)
+        try:
+            wait_ready(base_url, args.startup_timeout)
+            # Let every worker finish loading
+            time.sleep(2)
+            level_args = argparse.Namespace(
+                endpoint=args.endpoint, concurrency=[args.concurrency], requests=args.requests, warmup=args.warmup,
+            )
+            level = asyncio.run(run_http(level_args, payloads, base_url))[0]
+            rss, pss = memory_mb(process_tree(server.pid))
+        finally:
+            server.terminate()
+            server.wait()
+        result = dict(level, workers=workers, rss_mb=rss, pss_mb=pss)
+        print(
+            f"workers {workers}: {result['throughput_rps']:8.1f} req/s   p99 {result['p99_ms']:7.2f} ms   "
+            f"RSS {rss:7.1f} MB   PSS {pss:7.1f} MB"
+        )
+        results.append(result)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{git_commit()}-workers.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"engine": os.getenv("INFERENCE_ENGINE", "sklearn"), "results": results}, f, indent=2)
+    print(f"Results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
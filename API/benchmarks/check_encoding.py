@@ -0,0 +1,67 @@
+"""
+    Train-time and serve-time encodings must be byte-identical: the "encoder"
+    step of the logged pipeline against the FeatureEncoder of the API, on the
+    DataFrame path (batches) and on the validated features path (single
+    predictions). Exits with an error on any difference.
+
+    Without --model-uri the pipeline is fitted on the data with the training
+    code of mlflow/train.py.
+
+    Usage (from the API folder):
+        python benchmarks/check_encoding.py
+        python benchmarks/check_encoding.py --model-uri models:/get_around_price_prediction/1
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+
+from app import PredictionFeatures
+from encoding import FeatureEncoder
+
+
+def fit_pipeline(X, y):
+    """
+        Pipeline fitted by the training code, with a small forest: only the encoder is checked.
+    """
+    sys.path.insert(0, os.path.join(os.path.dirname(API_DIR), "mlflow"))
+    from train import build_lookup_table, build_pipeline
+
+    return build_pipeline(build_lookup_table(X), {"n_estimators": 5}).fit(X, y)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-uri", help="Logged pipeline to check, fitted on the data when not given")
+    parser.add_argument("--data", default=os.path.join(os.path.dirname(API_DIR), "mlflow", "get_around_pricing_project.csv"))
+    args = parser.parse_args()
+
+    data = pd.read_csv(args.data, index_col=0)
+    X = data.drop(columns="rental_price_per_day")
+    if args.model_uri:
+        import mlflow.sklearn
+
+        pipeline = mlflow.sklearn.load_model(args.model_uri)
+    else:
+        pipeline = fit_pipeline(X, data["rental_price_per_day"])
+
+    expected = np.ascontiguousarray(pipeline.named_steps["encoder"].transform(X), dtype=np.float64)
+    encoder = FeatureEncoder.from_pipeline(pipeline)
+    encodings = {
+        "encode_frame": encoder.encode_frame(X),
+        "encode_features": encoder.encode_features([PredictionFeatures(**row) for row in X.to_dict(orient="records")]),
+    }
+    for name, encoded in encodings.items():
+        if encoded.tobytes() != expected.tobytes():
+            rows = np.flatnonzero((encoded != expected).any(axis=1)) if encoded.shape == expected.shape else np.array([], dtype=np.int64)
+            raise SystemExit(f"{name} differs from the pipeline encoding (shape {encoded.shape}, rows {rows[:10].tolist()})")
+    print(f"Same encoding as the pipeline on {len(X)} rows: {', '.join(encodings)}")
+
+
+if __name__ == "__main__":
+    main()
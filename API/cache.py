@@ -0,0 +1,81 @@
+import os
+import time
+from collections import OrderedDict
+
+
+# Maximum number of predictions kept in memory
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+
+# Time (in seconds) a cached prediction stays valid, 0 to keep it until evicted
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+
+# ---------------- Prediction cache ----------------
+def feature_key(features, columns):
+    """
+        Canonical key of validated features: their values in a fixed column order.
+    """
+    key = []
+    for column in columns:
+        value = getattr(features, column)
+        key.append(value.value if hasattr(value, "value") else value)
+    return tuple(key)
+
+
+class PredictionCache:
+    """
+        LRU cache of predictions with a time to live.
+
+        Entries are keyed on the canonical features and belong to one model
+        version: the whole cache is dropped as soon as another version is served.
+    """
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.model_version = None
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, model_version, key):
+        self._check_version(model_version)
+        entry = self._entries.get(key)
+        if entry is not None:
+            prediction, expires_at = entry
+            if expires_at is None or expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return prediction
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, model_version, key, prediction):
+        self._check_version(model_version)
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds > 0 else None
+        self._entries[key] = (prediction, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            "model_version": self.model_version,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / requests if requests else 0.0,
+        }
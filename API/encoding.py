@@ -0,0 +1,73 @@
+import numpy as np
+import pandas as pd
+
+
+# ---------------- Feature encoder ----------------
+class FeatureEncoder:
+    """
+        Encodes the features with the lookup table fixed at training time.
+
+        The code of a category is its index in the list of categories of its
+        column (-1 for an unknown category), the other columns are kept as
+        numbers, in the training column order. This is exactly what the
+        "encoder" step of the logged pipeline does, without going through it.
+    """
+
+    def __init__(self, lookup_table):
+        self.columns = list(lookup_table["columns"])
+        self.categories = {column: list(values) for column, values in lookup_table["categories"].items()}
+        # category -> code, per column (None for the numeric columns)
+        self._codes = [
+            {category: float(code) for code, category in enumerate(self.categories[column])}
+            if column in self.categories else None
+            for column in self.columns
+        ]
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        """
+            Rebuild the lookup table from the fitted "encoder" step of the pipeline.
+        """
+        column_transformer = pipeline.named_steps["encoder"]
+        columns = []
+        categories = {}
+        for column, encoder, _ in column_transformer.transformers_:
+            if column == "remainder":
+                continue
+            columns.append(column)
+            # Fitted passthrough columns have no categories
+            if hasattr(encoder, "categories_"):
+                categories[column] = [str(value) for value in encoder.categories_[0]]
+        return cls({"columns": columns, "categories": categories})
+
+    def lookup_table(self):
+        return {"columns": self.columns, "categories": self.categories}
+
+    def encode_features(self, features_list):
+        """
+            Encode validated features straight into a float64 array, without pandas.
+            Used on the single prediction path, the DataFrame path is kept for batches.
+        """
+        encoded = np.empty((len(features_list), len(self.columns)), dtype=np.float64)
+        for row, features in enumerate(features_list):
+            for index, column in enumerate(self.columns):
+                value = getattr(features, column)
+                codes = self._codes[index]
+                if codes is None:
+                    encoded[row, index] = value
+                else:
+                    # Enums are looked up by their raw string value
+                    encoded[row, index] = codes.get(getattr(value, "value", value), -1.0)
+        return encoded
+
+    def encode_frame(self, data):
+        """
+            Encode a DataFrame into a float64 array, one row per car.
+        """
+        encoded = np.empty((len(data), len(self.columns)), dtype=np.float64)
+        for index, column in enumerate(self.columns):
+            if column in self.categories:
+                encoded[:, index] = pd.Categorical(data[column], categories=self.categories[column]).codes
+            else:
+                encoded[:, index] = data[column].to_numpy(dtype=np.float64)
+        return encoded
@@ -0,0 +1,130 @@
+import json
+import os
+
+import numpy as np
+
+
+# ---------------- Flat forest ----------------
+class FlatForest:
+    """
+        RandomForestRegressor compiled into flat NumPy arrays.
+
+        The nodes of all the trees are stored one after the other in contiguous
+        arrays (feature, threshold, children, value) and roots holds the
+        index of the first node of each tree. children[node] holds the left
+        and right child of the node and leaves point to themselves, so every
+        tree is traversed in max_depth vectorized steps for all the rows at
+        once, without sklearn's input validation and joblib dispatch.
+    """
+
+    ARRAYS = ("feature", "threshold", "children", "value", "roots")
+
+    def __init__(self, feature, threshold, children, value, roots, max_depth):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_sklearn(cls, forest):
+        """
+            Export the trees of a fitted RandomForestRegressor into flat arrays.
+        """
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count, dtype=np.int32) + offset
+            is_leaf = tree.children_left < 0
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            children.append(np.stack([
+                np.where(is_leaf, nodes, tree.children_left + offset),
+                np.where(is_leaf, nodes, tree.children_right + offset),
+            ], axis=1).astype(np.int32))
+            values.append(tree.value[:, 0, 0].astype(np.float64))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(
+            np.concatenate(features),
+            np.concatenate(thresholds),
+            np.concatenate(children),
+            np.concatenate(values),
+            np.array(roots, dtype=np.int32),
+            max_depth,
+        )
+
+    def save(self, directory):
+        """
+            One .npy file per array, so they can be memory-mapped by every worker.
+        """
+        for name in self.ARRAYS:
+            np.save(os.path.join(directory, f"{name}.npy"), np.ascontiguousarray(getattr(self, name)))
+        with open(os.path.join(directory, "forest.json"), "w") as f:
+            json.dump({"max_depth": self.max_depth}, f)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        """
+            Load the arrays, memory-mapped read-only by default: the pages are
+            then shared by all the processes that map the same files.
+        """
+        arrays = [np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r" if mmap else None) for name in cls.ARRAYS]
+        with open(os.path.join(directory, "forest.json")) as f:
+            max_depth = json.load(f)["max_depth"]
+        return cls(*arrays, max_depth)
+
+    def predict(self, X):
+        """
+            Average of the trees, computed like sklearn (float32 inputs, trees summed in order).
+        """
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(len(X))
+        children = self.children.reshape(-1)
+        # One row per tree, one column per input row
+        nodes = np.repeat(self.roots[:, None], len(X), axis=1)
+        for _ in range(self.max_depth):
+            go_right = X[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = children[2 * nodes + go_right]
+        # Summing over the first axis adds the trees one after the other
+        return self.value[nodes].sum(axis=0) / len(self.roots)
+
+
+class FlatForestModel:
+    """
+        Standard scaler followed by a flat forest: the scaler and model steps
+        of the training pipeline, evaluated with plain NumPy.
+    """
+
+    def __init__(self, mean, scale, forest):
+        self.mean = mean
+        self.scale = scale
+        self.forest = forest
+
+    @classmethod
+    def from_pipeline(cls, pipeline):
+        scaler = pipeline.named_steps["scaler"]
+        return cls(scaler.mean_, scaler.scale_, FlatForest.from_sklearn(pipeline.named_steps["model"]))
+
+    def save(self, directory):
+        np.save(os.path.join(directory, "scaler_mean.npy"), self.mean)
+        np.save(os.path.join(directory, "scaler_scale.npy"), self.scale)
+        self.forest.save(directory)
+
+    @classmethod
+    def load(cls, directory, mmap=True):
+        return cls(
+            np.load(os.path.join(directory, "scaler_mean.npy")),
+            np.load(os.path.join(directory, "scaler_scale.npy")),
+            FlatForest.load(directory, mmap=mmap),
+        )
+
+    def predict(self, X):
+        X = np.array(X, dtype=np.float64)
+        X -= self.mean
+        X /= self.scale
+        return self.forest.predict(X)
@@ -0,0 +1,98 @@
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+
+# Share of the requests whose payload (features, prediction) is logged
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+# Records waiting to be written, the newest ones are dropped when it is full
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Id of the request being served, set by the request id middleware
+request_id_var = ContextVar("request_id", default=None)
+
+# Attributes of every LogRecord, anything else was passed with extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+# ---------------- Formatting ----------------
+class JsonFormatter(logging.Formatter):
+    """
+        One JSON object per line, with the request id and the extra fields.
+    """
+
+    def format(self, record):
+        payload = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            payload["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                payload[key] = value
+        if record.exc_info:
+            payload["exception"] = self.formatException(record.exc_info)
+        return json.dumps(payload, default=str, ensure_ascii=False)
+
+
+# ---------------- Non-blocking handler ----------------
+class DroppingQueueHandler(QueueHandler):
+    """
+        Puts the records in a bounded queue, written to stdout by a background thread.
+
+        Formatting is left to the background thread and records are dropped
+        (and counted) instead of blocking the request when the queue is full.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Keep the request id of the caller, the rest is done by the listener
+        record.request_id = request_id_var.get()
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging(name="api"):
+    """
+        Route the records of the logger through the queue.
+        Returns the handler (for its dropped counter) and the listener,
+        the writer thread to start and stop with the application.
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    queue_handler = DroppingQueueHandler(log_queue)
+    listener = QueueListener(log_queue, stream_handler)
+
+    logger = logging.getLogger(name)
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [queue_handler]
+    logger.propagate = False
+    return queue_handler, listener
+
+
+def sample_payload():
+    """
+        Whether the payload of the current request should be logged.
+    """
+    return LOG_SAMPLE_RATE > 0 and random.random() < LOG_SAMPLE_RATE
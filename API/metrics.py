@@ -0,0 +1,154 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Latency buckets (in seconds), from a cache hit to a large batch
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Batch size buckets (number of rows)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 10000)
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+# ---------------- Metrics ----------------
+class Counter:
+    """
+        Monotonic counter, one value per combination of labels.
+    """
+
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        return [(self.name, self.labelnames, key, (), value) for key, value in sorted(values.items())]
+
+
+class Gauge:
+    """
+        Value read when the metrics are scraped, from a counter kept elsewhere
+        (metric_type="counter") or from the current state of the API.
+    """
+
+    def __init__(self, name, documentation, function, metric_type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+        self.type = metric_type
+
+    def samples(self):
+        return [(self.name, (), (), (), self.function())]
+
+
+class Histogram:
+    """
+        Cumulative histogram with a sum and a count, one per combination of labels.
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets) + (float("inf"),)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start_time, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        samples = []
+        for key, (counts, total) in sorted(values.items()):
+            for bound, count in zip(self.buckets, counts):
+                samples.append((self.name + "_bucket", self.labelnames, key, (("le", _format_value(bound)),), count))
+            samples.append((self.name + "_sum", self.labelnames, key, (), total))
+            samples.append((self.name + "_count", self.labelnames, key, (), counts[-1]))
+        return samples
+
+
+class Registry:
+    """
+        Metrics exposed on /metrics, in the Prometheus text format.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labelnames, labelvalues, extra, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labelnames, labelvalues, extra)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+# ---------------- Metrics of the API ----------------
+registry = Registry()
+
+REQUESTS = registry.register(Counter(
+    "api_requests_total", "HTTP requests by route and status code.", ("method", "path", "status"),
+))
+REQUEST_LATENCY = registry.register(Histogram(
+    "api_request_duration_seconds", "HTTP request latency by route.", ("method", "path"),
+))
+PREDICTION_ERRORS = registry.register(Counter(
+    "api_prediction_errors_total", "Predictions that failed, including the ones answered with an error body.", ("endpoint",),
+))
+STAGE_LATENCY = registry.register(Histogram(
+    "api_stage_duration_seconds", "Latency of each stage: model_load, dataframe, encode, inference, serialization.", ("stage",),
+))
+BATCH_SIZE = registry.register(Histogram(
+    "api_batch_size", "Number of rows predicted together.", ("endpoint",), buckets=SIZE_BUCKETS,
+))
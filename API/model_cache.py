@@ -0,0 +1,122 @@
+import json
+import os
+import shutil
+import tempfile
+
+import joblib
+
+from encoding import FeatureEncoder
+from forest import FlatForestModel
+
+
+# Folder of the cached models, shared by all the workers of the container
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "model_cache"))
+
+# Number of versions kept on disk (the served one is always kept)
+MODEL_CACHE_KEEP = int(os.getenv("MODEL_CACHE_KEEP", "3"))
+
+# ---------------- Local cache of the models ----------------
+def version_dir(version, cache_dir=None):
+    """
+        Folder of one model version.
+    """
+    return os.path.join(cache_dir or MODEL_CACHE_DIR, str(version).replace("/", "_").replace(":", "_"))
+
+
+def is_cached(version, cache_dir=None):
+    return os.path.exists(os.path.join(version_dir(version, cache_dir), "model.json"))
+
+
+def save_model(version, pipeline, info, cache_dir=None):
+    """
+        Write a version: lookup table, flat forest arrays (memory-mappable)
+        and the pipeline itself for the sklearn inference engine.
+
+        Files are written in a temporary folder renamed at the end, so a
+        worker never loads a half-written version.
+    """
+    target = version_dir(version, cache_dir)
+    if is_cached(version, cache_dir):
+        return target
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix=".tmp-", dir=os.path.dirname(target))
+    try:
+        with open(os.path.join(tmp_dir, "encoding.json"), "w", encoding="utf-8") as f:
+            json.dump(FeatureEncoder.from_pipeline(pipeline).lookup_table(), f, ensure_ascii=False)
+        FlatForestModel.from_pipeline(pipeline).save(tmp_dir)
+        joblib.dump(pipeline, os.path.join(tmp_dir, "pipeline.joblib"))
+        # Written last: marks the version as complete
+        with open(os.path.join(tmp_dir, "model.json"), "w", encoding="utf-8") as f:
+            json.dump(dict(info, version=version), f)
+        os.rename(tmp_dir, target)
+    except OSError:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        # Another worker wrote the same version first
+        if not is_cached(version, cache_dir):
+            raise
+    return target
+
+
+def load_model(version, engine="flat", cache_dir=None):
+    """
+        Load a cached version: lookup table, model for the engine and its info.
+        The flat forest arrays are memory-mapped read-only.
+    """
+    directory = version_dir(version, cache_dir)
+    with open(os.path.join(directory, "encoding.json"), encoding="utf-8") as f:
+        encoder = FeatureEncoder(json.load(f))
+    with open(os.path.join(directory, "model.json"), encoding="utf-8") as f:
+        info = json.load(f)
+    if engine == "flat":
+        model = FlatForestModel.load(directory, mmap=True)
+    else:
+        # Scaler and forest, fed with the already encoded features
+        model = joblib.load(os.path.join(directory, "pipeline.joblib"))[1:]
+    return encoder, model, info
+
+
+# ---------------- Served version ----------------
+def read_current(source, cache_dir=None):
+    """
+        Version last served for this source (model URI or registered model), if cached.
+    """
+    try:
+        with open(os.path.join(cache_dir or MODEL_CACHE_DIR, "current.json"), encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        return None
+    version = current.get(source)
+    return version if version and is_cached(version, cache_dir) else None
+
+
+def write_current(source, version, cache_dir=None):
+    directory = cache_dir or MODEL_CACHE_DIR
+    path = os.path.join(directory, "current.json")
+    try:
+        with open(path, encoding="utf-8") as f:
+            current = json.load(f)
+    except (OSError, ValueError):
+        current = {}
+    current[source] = version
+    # Replaced in one step, never read half-written
+    fd, tmp_path = tempfile.mkstemp(prefix=".current-", dir=directory)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(current, f)
+    os.replace(tmp_path, path)
+
+
+def cleanup(keep, cache_dir=None):
+    """
+        Remove the oldest versions, except the ones in keep.
+        Workers still mapping a removed version keep their pages until they unmap it.
+    """
+    directory = cache_dir or MODEL_CACHE_DIR
+    versions = [
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if not name.startswith(".") and os.path.isdir(os.path.join(directory, name))
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    kept = {version_dir(version, cache_dir) for version in keep}
+    for path in versions[MODEL_CACHE_KEEP:]:
+        if path not in kept:
+            shutil.rmtree(path, ignore_errors=True)
@@ -0,0 +1,217 @@
+import os
+import threading
+import time
+
+
+# Registered model served by the API
+MODEL_NAME = os.getenv("MODEL_NAME", "get_around_price_prediction")
+
+# Alias of the served version (e.g. "production"), empty to serve the latest version
+MODEL_ALIAS = os.getenv("MODEL_ALIAS", "")
+
+# Latest version of the registered model
+DEFAULT_MODEL_URI = f"models:/{MODEL_NAME}/latest"
+
+# "sklearn" to predict with the pipeline, "flat" to predict with the flat forest arrays.
+# The flat forest is much faster on single rows (about 30x on get_around_pricing_project.csv)
+# and its memory-mapped arrays are shared by the workers, but it walks every tree down to
+# its deepest leaf: large batches are about 4.5x slower than with sklearn (448 ms against
+# 101 ms for the 4,843 rows of the CSV, see benchmarks/bench_forest.py). Keep "sklearn"
+# when /predict/batch and /predict/batch/file carry most of the traffic.
+INFERENCE_ENGINE = os.getenv("INFERENCE_ENGINE", "sklearn")
+
+# Seconds between two checks for a new version, 0 to never check
+MODEL_REFRESH_SECONDS = float(os.getenv("MODEL_REFRESH_SECONDS", "300"))
+
+# Start from the version last served, in the local cache, without asking the tracking server
+MODEL_OFFLINE_START = os.getenv("MODEL_OFFLINE_START", "true").lower() == "true"
+
+# ---------------- Loaded model ----------------
+class LoadedModel:
+    """
+        One version of the model: its lookup table and the model for the engine.
+        A request uses the same LoadedModel from encoding to prediction.
+    """
+
+    def __init__(self, version, encoder, model, info):
+        self.version = version
+        self.encoder = encoder
+        self.model = model
+        self.info = info
+
+    def encode_features(self, features_list):
+        """
+            Encode validated features with the lookup table of the model, without pandas.
+        """
+        return self.encoder.encode_features(features_list)
+
+    def encode_frame(self, data):
+        """
+            Encode a DataFrame of raw features with the lookup table of the model.
+        """
+        return self.encoder.encode_frame(data)
+
+    def predict(self, input_data):
+        """
+            Predict from encoded features.
+        """
+        return self.model.predict(input_data)
+
+
+# ---------------- Model holder ----------------
+class ModelHolder:
+    """
+        Keeps the pricing model in memory for the whole life of the API.
+
+        The served model is either pinned with MODEL_URI (any MLflow model URI
+        or a local path) or the latest version of the registered model
+        MODEL_NAME (or its MODEL_ALIAS version). It is loaded once at startup
+        and every request is served from memory.
+
+        The logged model is the training pipeline (encoder, scaler, forest):
+        requests are encoded with its lookup table and only the scaler and
+        the forest run at prediction time, either with sklearn or, with the
+        "flat" inference engine, with the forest compiled into NumPy arrays.
+
+        Each version is stored in the local model cache, where the flat arrays
+        are memory-mapped read-only by all the workers. The API starts from the
+        version last served without touching the tracking server, then
+        refresh() looks for a new version in the background and swaps it in
+        one assignment: requests already running finish with the old version.
+    """
+
+    def __init__(self, model_uri=None, engine=None, model_name=None, alias=None):
+        self.model_uri = model_uri or os.getenv("MODEL_URI")
+        self.model_name = model_name or MODEL_NAME
+        self.alias = alias if alias is not None else MODEL_ALIAS
+        self.engine = engine or INFERENCE_ENGINE
+        if self.engine not in ("sklearn", "flat"):
+            raise ValueError(f"Unknown inference engine: {self.engine}")
+        # What is served, key of the served version in the local cache
+        self.source = self.model_uri or f"models:/{self.model_name}@{self.alias or 'latest'}"
+        self.current = None
+        self.loaded_from = None
+        self.error = None
+        self.load_time = None
+        self.last_refresh = None
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self):
+        return self.current is not None
+
+    @property
+    def version(self):
+        current = self.current
+        return current.version if current is not None else None
+
+    def resolve(self):
+        """
+            Ask the tracking server which version to serve.
+            Returns its cache key, its model URI and its info.
+        """
+        import mlflow
+        from mlflow import MlflowClient
+
+        if self.model_uri:
+            # The run that produced the model identifies its version
+            run_id = mlflow.models.get_model_info(self.model_uri).run_id
+            return run_id or self.model_uri, self.model_uri, {"model_uri": self.model_uri, "run_id": run_id}
+
+        client = MlflowClient()
+        if self.alias:
+            model_version = client.get_model_version_by_alias(self.model_name, self.alias)
+        else:
+            model_versions = client.search_model_versions(f"name='{self.model_name}'")
+            if not model_versions:
+                raise ValueError(f"No version of the registered model {self.model_name}")
+            model_version = max(model_versions, key=lambda model_version: int(model_version.version))
+        model_uri = f"models:/{self.model_name}/{model_version.version}"
+        info = {
+            "model_uri": model_uri,
+            "model_name": self.model_name,
+            "registered_version": model_version.version,
+            "run_id": model_version.run_id,
+        }
+        return f"{self.model_name}-v{model_version.version}", model_uri, info
+
+    def _fetch(self, version, model_uri, info):
+        import mlflow.sklearn
+        import model_cache
+
+        # Download the version into the local cache, unless it is already there
+        if not model_cache.is_cached(version):
+            pipeline = mlflow.sklearn.load_model(model_uri)
+            if "encoder" not in getattr(pipeline, "named_steps", {}):
+                raise ValueError("The model was not logged as a pipeline with an encoder step")
+            model_cache.save_model(version, pipeline, info)
+        return LoadedModel(version, *model_cache.load_model(version, self.engine))
+
+    def _serve(self, loaded):
+        import model_cache
+
+        self.current = loaded
+        model_cache.write_current(self.source, loaded.version)
+        model_cache.cleanup([loaded.version])
+
+    def load(self):
+        """
+            Load the model at startup: from the local cache if this source was
+            already served, else from the tracking server (or local store).
+        """
+        # Heavy imports (numpy, pandas, sklearn) happen here, not when the API starts
+        import model_cache
+
+        with self._lock:
+            if self.current is not None:
+                return self.current
+            start_time = time.time()
+            try:
+                cached_version = model_cache.read_current(self.source) if MODEL_OFFLINE_START else None
+                if cached_version is not None:
+                    self.current = LoadedModel(cached_version, *model_cache.load_model(cached_version, self.engine))
+                    self.loaded_from = "cache"
+                else:
+                    self._serve(self._fetch(*self.resolve()))
+                    self.loaded_from = "tracking server"
+                self.error = None
+            except Exception as e:
+                self.error = str(e)
+                raise
+            self.load_time = time.time() - start_time
+            return self.current
+
+    def refresh(self):
+        """
+            Serve the version the tracking server points to, if it changed.
+            Returns True when a new version was swapped in.
+        """
+        if self.current is None:
+            self.load()
+            return True
+        self.last_refresh = time.time()
+        version, model_uri, info = self.resolve()
+        if version == self.version:
+            return False
+        # Loaded aside: requests keep using the current version meanwhile
+        start_time = time.time()
+        loaded = self._fetch(version, model_uri, info)
+        with self._lock:
+            self._serve(loaded)
+            self.loaded_from = "tracking server"
+            self.load_time = time.time() - start_time
+        return True
+
+    def status(self):
+        current = self.current
+        return {
+            "ready": current is not None,
+            "source": self.source,
+            "model_version": current.version if current is not None else None,
+            "model_info": current.info if current is not None else None,
+            "engine": self.engine,
+            "loaded_from": self.loaded_from,
+            "load_time": self.load_time,
+            "last_refresh": self.last_refresh,
+            "error": self.error,
+        }
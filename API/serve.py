@@ -0,0 +1,49 @@
+"""
+    Start the API with WORKERS uvicorn worker processes.
+
+    The served version is written in the local model cache once, before the
+    workers start, so they all start from it without asking the tracking
+    server. With the "flat" inference engine each worker then memory-maps the
+    same read-only arrays, so adding workers adds CPU for the forest without
+    adding one copy of the forest per worker. The flat engine trades batch
+    speed for this: large batches are slower than with sklearn (see
+    INFERENCE_ENGINE in model_holder.py).
+"""
+import os
+
+import uvicorn
+from dotenv import load_dotenv
+
+
+load_dotenv()
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "7860"))
+WORKERS = int(os.getenv("WORKERS", "1"))
+
+
+def prepare_model():
+    """
+        Write the served version in the model cache.
+    """
+    import mlflow
+    from model_holder import ModelHolder
+
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    holder = ModelHolder()
+    try:
+        holder.load()
+        print(f"Model {holder.version} ready in the model cache")
+    except Exception as e:
+        # Each worker retries on its own and reports it on /ready
+        print("Error while preparing the model cache:", e)
+
+
+def main():
+    if WORKERS > 1:
+        prepare_model()
+    uvicorn.run("app:app", host=HOST, port=PORT, workers=WORKERS)
+
+
+if __name__ == "__main__":
+    main()
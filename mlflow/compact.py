@@ -0,0 +1,274 @@
+"""
+    Compact a trained pricing pipeline for serving.
+
+    The forest of a logged pipeline is rebuilt with fewer trees, a depth cap,
+    thresholds snapped to float32 and leaf values quantized to int16 (with a
+    scale and an offset), and sibling leaves left with the same value merged
+    into their parent. Every combination of --trees and --max-depth is
+    evaluated on the test split of train.py; the smallest one within
+    --rmse-tolerance of the original model is logged as a separate MLflow
+    model, with the report of all the combinations.
+
+    Usage (from the mlflow folder):
+        python compact.py --model-uri models:/get_around_price_prediction/latest --trees 25,50,100 --max-depth 8,12,16,0
+"""
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import mlflow
+import mlflow.sklearn
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from mlflow import log_metric, log_param
+from sklearn.metrics import mean_squared_error
+from sklearn.model_selection import train_test_split
+from sklearn.tree._tree import TREE_LEAF, TREE_UNDEFINED, Tree
+
+from dataset import DATA_PATH, load_dataset
+from train import serving_cost
+
+
+# ---------------- Quantization ----------------
+class ValueQuantizer:
+    """
+        Leaf values stored as int16: value = offset + scale * (code + 32768).
+    """
+
+    def __init__(self, low, high):
+        self.offset = float(low)
+        self.scale = float(high - low) / 65535 or 1.0
+
+    @classmethod
+    def from_forest(cls, estimators):
+        values = np.concatenate([estimator.tree_.value.ravel() for estimator in estimators])
+        return cls(values.min(), values.max())
+
+    def encode(self, values):
+        return (np.rint((values - self.offset) / self.scale) - 32768).astype(np.int16)
+
+    def decode(self, codes):
+        return self.offset + self.scale * (codes.astype(np.float64) + 32768)
+
+
+def float32_threshold(threshold):
+    """
+        Largest float32 not above the threshold. The forest compares float32
+        inputs with "x <= threshold", so the decisions do not change.
+    """
+    snapped = np.float32(threshold)
+    if snapped > threshold:
+        snapped = np.nextafter(snapped, np.float32(-np.inf))
+    return float(snapped)
+
+
+# ---------------- Tree compaction ----------------
+def compact_tree(estimator, max_depth=None, quantizer=None):
+    """
+        Copy of a fitted tree with its nodes below max_depth cut, float32
+        thresholds, quantized values and identical sibling leaves merged.
+        Nodes are renumbered in depth-first order, so a left child always
+        follows its parent.
+    """
+    tree = estimator.tree_
+    state = tree.__getstate__()
+    nodes = state["nodes"]
+    values = state["values"]
+    if quantizer is not None:
+        values = quantizer.decode(quantizer.encode(values))
+
+    new_nodes, new_values = [], []
+    depth_reached = 0
+
+    def build(node, depth):
+        nonlocal depth_reached
+        index = len(new_nodes)
+        new_nodes.append(nodes[node].copy())
+        new_values.append(values[node])
+        left, right = nodes[node]["left_child"], nodes[node]["right_child"]
+        if left != TREE_LEAF and (max_depth is None or depth < max_depth):
+            new_left = build(left, depth + 1)
+            new_right = build(right, depth + 1)
+            is_leaf = lambda child: new_nodes[child]["left_child"] == TREE_LEAF
+            if not (is_leaf(new_left) and is_leaf(new_right) and np.array_equal(new_values[new_left], new_values[new_right])):
+                new_nodes[index]["left_child"] = new_left
+                new_nodes[index]["right_child"] = new_right
+                new_nodes[index]["threshold"] = float32_threshold(nodes[node]["threshold"])
+                return index
+            # Both leaves predict the same value: the split is useless
+            del new_nodes[index + 1:], new_values[index + 1:]
+        new_nodes[index]["left_child"] = TREE_LEAF
+        new_nodes[index]["right_child"] = TREE_LEAF
+        new_nodes[index]["feature"] = TREE_UNDEFINED
+        new_nodes[index]["threshold"] = TREE_UNDEFINED
+        depth_reached = max(depth_reached, depth)
+        return index
+
+    build(0, 0)
+    new_tree = Tree(*tree.__reduce__()[1])
+    new_tree.__setstate__({
+        "max_depth": depth_reached,
+        "node_count": len(new_nodes),
+        "nodes": np.array(new_nodes, dtype=nodes.dtype),
+        "values": np.ascontiguousarray(new_values, dtype=np.float64),
+    })
+    compacted = copy.copy(estimator)
+    compacted.tree_ = new_tree
+    return compacted
+
+
+def compact_pipeline(pipeline, n_trees=None, max_depth=None, quantize=True):
+    """
+        Copy of the pipeline with its forest compacted. Returns the pipeline
+        and the quantizer of the values (None without quantization).
+    """
+    compacted = copy.deepcopy(pipeline)
+    forest = compacted.named_steps["model"]
+    estimators = forest.estimators_[:n_trees]
+    quantizer = ValueQuantizer.from_forest(estimators) if quantize else None
+    forest.estimators_ = [compact_tree(estimator, max_depth, quantizer) for estimator in estimators]
+    forest.n_estimators = len(forest.estimators_)
+    return compacted, quantizer
+
+
+def compact_arrays(forest, quantizer=None):
+    """
+        Storage format of a compacted forest: int16 features, float32
+        thresholds, int32 right children (the left child is the next node),
+        int16 values with their scale and offset (float64 without quantization).
+    """
+    features, thresholds, rights, values, roots = [], [], [], [], []
+    offset = 0
+    for estimator in forest.estimators_:
+        tree = estimator.tree_
+        is_leaf = tree.children_left == TREE_LEAF
+        features.append(np.where(is_leaf, -1, tree.feature).astype(np.int16))
+        thresholds.append(np.where(is_leaf, 0, tree.threshold).astype(np.float32))
+        rights.append(np.where(is_leaf, -1, tree.children_right + offset).astype(np.int32))
+        values.append(tree.value.ravel())
+        roots.append(offset)
+        offset += tree.node_count
+    values = np.concatenate(values)
+    arrays = {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "right": np.concatenate(rights),
+        "value": quantizer.encode(values) if quantizer is not None else values,
+        "roots": np.array(roots, dtype=np.int32),
+    }
+    if quantizer is not None:
+        arrays["value_scale"] = np.array([quantizer.scale])
+        arrays["value_offset"] = np.array([quantizer.offset])
+    return arrays
+
+
+# ---------------- Report ----------------
+def evaluate(pipeline, quantizer, X_test, y_test):
+    forest = pipeline.named_steps["model"]
+    y_pred = pipeline.predict(X_test)
+    return dict(
+        serving_cost(pipeline, X_test),
+        n_trees=len(forest.estimators_),
+        node_count=sum(estimator.tree_.node_count for estimator in forest.estimators_),
+        compact_size_mb=sum(array.nbytes for array in compact_arrays(forest, quantizer).values()) / 1e6,
+        rmse=float(np.sqrt(mean_squared_error(y_test, y_pred))),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-uri", default="models:/get_around_price_prediction/latest")
+    parser.add_argument("--data", default=DATA_PATH, help="Data the model was trained on, CSV or Parquet")
+    parser.add_argument("--trees", default="25,50,100", type=lambda value: [int(n) for n in value.split(",")],
+                        help="Numbers of trees kept (the first ones of the forest)")
+    parser.add_argument("--max-depth", default="8,12,16,0", type=lambda value: [int(n) for n in value.split(",")],
+                        help="Depth caps, 0 for no cap")
+    parser.add_argument("--no-quantize", action="store_true", help="Keep float64 leaf values")
+    parser.add_argument("--rmse-tolerance", type=float, default=0.01, help="Relative RMSE increase accepted")
+    parser.add_argument("--registered-name", default="get_around_price_prediction_compact",
+                        help="Registered model of the compacted pipeline, empty to only log it")
+    args = parser.parse_args()
+
+    # Load .env file
+    load_dotenv()
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+    mlflow.set_experiment("get_around_price_prediction")
+
+    # Same test split as train.py
+    data = load_dataset(args.data)
+    X = data.drop(columns='rental_price_per_day')
+    y = data['rental_price_per_day']
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+    pipeline = mlflow.sklearn.load_model(args.model_uri)
+    lookup_table = mlflow.artifacts.load_dict(f"runs:/{mlflow.models.get_model_info(args.model_uri).run_id}/encoding.json")
+
+    # Lossless compaction (float32 thresholds only): predictions must not change
+    lossless, _ = compact_pipeline(pipeline, quantize=False)
+    if pipeline.predict(X_test).tobytes() != lossless.predict(X_test).tobytes():
+        raise ValueError("Compacted forest predictions differ from the original forest")
+
+    with mlflow.start_run(run_name="compact"):
+        start_time = time.time()
+        mlflow.set_tag("source_model_uri", args.model_uri)
+
+        original = evaluate(pipeline, None, X_test, y_test)
+        report = [dict(original, config="original", max_depth=None, quantize=False)]
+        candidates = []
+        for n_trees in args.trees:
+            for max_depth in args.max_depth:
+                compacted, quantizer = compact_pipeline(pipeline, n_trees, max_depth or None, not args.no_quantize)
+                result = dict(
+                    evaluate(compacted, quantizer, X_test, y_test),
+                    config=f"trees={n_trees} depth={max_depth or 'none'}",
+                    max_depth=max_depth or None,
+                    quantize=quantizer is not None,
+                )
+                report.append(result)
+                candidates.append((result, compacted, quantizer))
+
+        report = pd.DataFrame(report)
+        columns = ["config", "n_trees", "max_depth", "node_count", "rmse", "model_size_mb", "compact_size_mb", "predict_latency_ms", "peak_memory_mb"]
+        print(report[columns].to_string(index=False))
+        mlflow.log_table(report, "compaction_report.json")
+
+        # Smallest compacted forest within the RMSE tolerance
+        accepted = [candidate for candidate in candidates if candidate[0]["rmse"] <= original["rmse"] * (1 + args.rmse_tolerance)]
+        if not accepted:
+            print("No compacted forest within the RMSE tolerance")
+            mlflow.set_tag("registered", False)
+            return
+        result, compacted, quantizer = min(accepted, key=lambda candidate: candidate[0]["compact_size_mb"])
+        print(f"Selected {result['config']}: rmse {result['rmse']:.2f} (original {original['rmse']:.2f}), "
+              f"{result['compact_size_mb']:.2f} MB (original {original['model_size_mb']:.2f} MB pickled)")
+
+        log_param("n_trees", result["n_trees"])
+        log_param("max_depth", result["max_depth"])
+        log_param("quantize", result["quantize"])
+        log_param("rmse_tolerance", args.rmse_tolerance)
+        for name in ["rmse", "node_count", "model_size_mb", "compact_size_mb", "predict_latency_ms", "batch_latency_ms", "peak_memory_mb"]:
+            log_metric(name, result[name])
+            log_metric(f"original_{name}", original[name])
+        log_metric("execution_time", time.time() - start_time)
+
+        # Compact arrays next to the model, lookup table for the API
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            arrays_path = os.path.join(tmp_dir, "compact_forest.npz")
+            np.savez(arrays_path, **compact_arrays(compacted.named_steps["model"], quantizer))
+            mlflow.log_artifact(arrays_path)
+        mlflow.log_dict(lookup_table, "encoding.json")
+
+        mlflow.sklearn.log_model(
+            compacted, "model",
+            registered_model_name=args.registered_name or None,
+            signature=mlflow.models.signature.infer_signature(X_train, y_train),
+            serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE,
+            )
+        mlflow.set_tag("registered", bool(args.registered_name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import hashlib
+import os
+
+import mlflow
+import numpy as np
+import pandas as pd
+
+
+# Default training data
+DATA_PATH = os.getenv("TRAINING_DATA", "get_around_pricing_project.csv")
+
+# Rows read at once
+CHUNK_SIZE = int(os.getenv("DATA_CHUNK_SIZE", "100000"))
+
+# Compact dtypes of the pricing data (pandas defaults are object and int64)
+DTYPES = {
+    "model_key": "category",
+    "mileage": "int32",
+    "engine_power": "int32",
+    "fuel": "category",
+    "paint_color": "category",
+    "car_type": "category",
+    "private_parking_available": "bool",
+    "has_gps": "bool",
+    "has_air_conditioning": "bool",
+    "automatic_car": "bool",
+    "has_getaround_connect": "bool",
+    "has_speed_regulator": "bool",
+    "winter_tires": "bool",
+    "rental_price_per_day": "int32",
+}
+
+
+# ---------------- Reading ----------------
+def iter_chunks(path, chunksize=CHUNK_SIZE):
+    """
+        Read a CSV or Parquet file chunk by chunk, with the compact dtypes.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize, columns=list(DTYPES)):
+            yield batch.to_pandas().astype(DTYPES)
+    else:
+        yield from pd.read_csv(path, index_col=0, dtype=DTYPES, chunksize=chunksize)
+
+
+def load_dataset(path=DATA_PATH, sample=None, start=0, stop=None, seed=42, chunksize=CHUNK_SIZE):
+    """
+        Load the rows start to stop of the data (all by default), keeping each
+        row with probability sample (all by default). Only one chunk of the
+        file is in memory at a time on top of the rows kept.
+    """
+    rng = np.random.default_rng(seed)
+    chunks = []
+    position = 0
+    for chunk in iter_chunks(path, chunksize):
+        chunk_start, position = position, position + len(chunk)
+        if position <= start:
+            continue
+        if stop is not None and chunk_start >= stop:
+            break
+        chunk = chunk.iloc[max(0, start - chunk_start):(None if stop is None else stop - chunk_start)]
+        if sample is not None and sample < 1:
+            chunk = chunk[rng.random(len(chunk)) < sample]
+        chunks.append(chunk)
+    if not chunks:
+        raise ValueError(f"No rows selected in {path}")
+
+    # Same categories in every chunk, so the concatenation stays categorical
+    for column, dtype in DTYPES.items():
+        if dtype == "category":
+            categories = pd.api.types.union_categoricals([chunk[column] for chunk in chunks]).categories
+            for chunk in chunks:
+                chunk[column] = chunk[column].cat.set_categories(categories)
+    return pd.concat(chunks)
+
+
+# ---------------- Logging ----------------
+def file_hash(path, block_size=1 << 20):
+    """
+        SHA-256 of the content of the file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def log_dataset(path, **selection):
+    """
+        Log the hash of the data and a reference to it in the active run.
+        The file is uploaded only if no run of the experiment uploaded the
+        same content before: the reference then points to that run.
+    """
+    digest = file_hash(path)
+    mlflow.set_tag("dataset_hash", digest)
+    mlflow.log_params({f"data_{name}": value for name, value in selection.items() if value is not None})
+
+    previous = mlflow.search_runs(
+        filter_string=f"tags.dataset_hash = '{digest}' and tags.dataset_uploaded = 'true'",
+        max_results=1,
+        output_format="list",
+    )
+    if previous:
+        run_id = previous[0].info.run_id
+        mlflow.set_tag("dataset_uploaded", "false")
+    else:
+        run_id = mlflow.active_run().info.run_id
+        mlflow.log_artifact(path, "data")
+        mlflow.set_tag("dataset_uploaded", "true")
+    mlflow.set_tag("dataset_uri", f"runs:/{run_id}/data/{os.path.basename(path)}")
+    return digest
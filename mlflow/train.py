@@ -1,84 +1,371 @@
 # Import useful libraries
 
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.preprocessing import OrdinalEncoder, StandardScaler
+from sklearn.compose import ColumnTransformer
+from sklearn.pipeline import Pipeline
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor
 from sklearn.metrics import mean_squared_error
 
+import argparse
+import itertools
+import math
 import os
+import pickle
+import random
 import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 from dotenv import load_dotenv
 import mlflow
 import mlflow.sklearn
-from mlflow import log_metric, log_param, log_artifact
+from mlflow import log_metric, log_param
 
-import pandas as pd
 import numpy as np
 
-# Load .env file
-load_dotenv()
-print("MLFLOW_TRACKING_URI =", os.getenv("MLFLOW_TRACKING_URI"))
+from dataset import CHUNK_SIZE, DATA_PATH, load_dataset, log_dataset
 
-# Set tracking URI to our Hugging Face application
-mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+# Categorical columns encoded with a fixed category-to-code lookup table
+CATEGORICAL_COLUMNS = ['model_key', 'fuel', 'paint_color', 'car_type']
 
-# Mlfow experiment setup
-experiment_name = "get_around_price_prediction"
-mlflow.set_experiment(experiment_name)
+# Forest trained without a search
+DEFAULT_PARAMS = {"n_estimators": 100, "max_depth": None, "min_samples_leaf": 1, "max_features": 1.0}
 
-with mlflow.start_run():
+# Hyperparameters tried by the search
+SEARCH_SPACE = {
+    "n_estimators": [25, 50, 100, 200],
+    "max_depth": [8, 12, 16, None],
+    "min_samples_leaf": [1, 2, 5, 10],
+    "max_features": [1.0, 0.5, "sqrt"],
+}
 
-    print("training model ...")
-    start_time = time.time()
+# Single-row predictions timed per trial
+LATENCY_REPEATS = 50
 
-    # Load data
-    data = pd.read_csv("get_around_pricing_project.csv", index_col=0)
+# Batch predictions (whole test set) timed per trial
+BATCH_REPEATS = 5
 
-    # Encode categorical vartiables
-    label_encoders = {}
-    for column in ['model_key', 'fuel', 'paint_color', 'car_type']:
-        label_encoders[column] = LabelEncoder()
-        data[column] = label_encoders[column].fit_transform(data[column])
+# Registration budgets, 0 for no budget
+MAX_LATENCY_MS = float(os.getenv("MAX_LATENCY_MS", "0"))
+MAX_MODEL_SIZE_MB = float(os.getenv("MAX_MODEL_SIZE_MB", "0"))
 
-    # Prepare featueres and label
-    X=data.drop(columns='rental_price_per_day')
-    y=data['rental_price_per_day']
+# Relative RMSE (e.g. 0.01 for 1%) traded for a faster model
+RMSE_TOLERANCE = float(os.getenv("RMSE_TOLERANCE", "0"))
 
-    # Standardize
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
 
-    # Split
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+def build_lookup_table(X):
+    """
+        Fixed category-to-code lookup table: the code of a category is its
+        index in the sorted list of categories (same codes as LabelEncoder).
+    """
+    return {
+        "columns": list(X.columns),
+        "categories": {column: sorted(X[column].unique().tolist()) for column in CATEGORICAL_COLUMNS},
+    }
 
-    # Train model
-    model = RandomForestRegressor(n_estimators=100, random_state=42)
+
+def build_encoder(lookup_table):
+    """
+        Encode the categorical columns with the lookup table and keep
+        every column at its place, so the encoded columns follow lookup_table["columns"].
+    """
+    transformers = []
+    for column in lookup_table["columns"]:
+        if column in lookup_table["categories"]:
+            encoder = OrdinalEncoder(
+                categories=[lookup_table["categories"][column]],
+                handle_unknown="use_encoded_value",
+                unknown_value=-1,
+            )
+        else:
+            encoder = "passthrough"
+        transformers.append((column, encoder, [column]))
+    return ColumnTransformer(transformers)
+
+
+def build_pipeline(lookup_table, params):
+    """
+        Pipeline logged for the API: encode categorical variables, standardize, predict.
+    """
+    return Pipeline([
+        ("encoder", build_encoder(lookup_table)),
+        ("scaler", StandardScaler()),
+        ("model", RandomForestRegressor(random_state=42, **params)),
+    ])
+
+
+def inference_latency(model, encoded, repeats=LATENCY_REPEATS):
+    """
+        Median latency (in milliseconds) of one prediction as served by the API:
+        scaler and forest on already encoded rows.
+    """
+    served = model[1:]
+    served.predict(encoded)
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        served.predict(encoded)
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings)) * 1000
+
+
+def serving_cost(model, X_test):
+    """
+        What the model costs to serve: single-row and batch (whole test set)
+        latency, serialized size and peak memory of loading the serialized
+        model and predicting the test set.
+    """
+    encoded = np.ascontiguousarray(model.named_steps["encoder"].transform(X_test), dtype=np.float64)
+    serialized = pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL)
+    # The forest arrays are numpy allocations: traced when the model is unpickled
+    tracemalloc.start()
+    try:
+        pickle.loads(serialized).predict(X_test)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {
+        "predict_latency_ms": inference_latency(model, encoded[:1]),
+        "batch_latency_ms": inference_latency(model, encoded, BATCH_REPEATS),
+        "model_size_mb": len(serialized) / 1e6,
+        "peak_memory_mb": peak_memory / 1e6,
+    }
+
+
+def within_budget(cost, max_latency_ms=MAX_LATENCY_MS, max_size_mb=MAX_MODEL_SIZE_MB):
+    return (
+        (not max_latency_ms or cost["predict_latency_ms"] <= max_latency_ms)
+        and (not max_size_mb or cost["model_size_mb"] <= max_size_mb)
+    )
+
+
+def select_trial(results, max_latency_ms=MAX_LATENCY_MS, max_size_mb=MAX_MODEL_SIZE_MB, rmse_tolerance=RMSE_TOLERANCE):
+    """
+        Registration policy: among the trials within the latency and size
+        budgets, the fastest one whose RMSE is at most rmse_tolerance above the
+        best RMSE. None when no trial fits the budgets.
+    """
+    candidates = [result for result in results if within_budget(result, max_latency_ms, max_size_mb)]
+    if not candidates:
+        return None
+    best_rmse = min(result["rmse"] for result in candidates)
+    accurate = [result for result in candidates if result["rmse"] <= best_rmse * (1 + rmse_tolerance)]
+    return min(accurate, key=lambda result: (result["predict_latency_ms"], result["rmse"]))
+
+
+# ---------------- Hyperparameter search ----------------
+# Data of the trials, set once in each worker process
+_trial_data = None
+
+
+def _init_worker(X_train, X_test, y_train, y_test, lookup_table):
+    global _trial_data
+    _trial_data = (X_train, X_test, y_train, y_test, lookup_table)
+
+
+def run_trial(params, n_samples=None):
+    """
+        Train one forest on the first n_samples training rows (all of them by
+        default) and return its test RMSE, training time and serving cost.
+    """
+    X_train, X_test, y_train, y_test, lookup_table = _trial_data
+    if n_samples is not None:
+        X_train, y_train = X_train.iloc[:n_samples], y_train.iloc[:n_samples]
+
+    model = build_pipeline(lookup_table, params)
+    start_time = time.perf_counter()
     model.fit(X_train, y_train)
+    fit_time = time.perf_counter() - start_time
 
-    # Preidct and evaluate
     y_pred = model.predict(X_test)
-    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-    
-    # Log metrics
-    log_metric("rmse", rmse)
-    log_metric("execution_time", time.time() - start_time)
-
-    # Log parameters
-    log_param("n_estimators", 100)
-    log_param("random_state", 42)
-    log_param("scaler", "StandardScaler")
-    log_param("label_encoders", ",".join(label_encoders.keys()))
-
-
-    # Log artifacts
-    log_artifact("get_around_pricing_project.csv")
-
-
-    # Log model
-    mlflow.sklearn.log_model(
-        model, "model",
-        registered_model_name="get_around_price_prediction",
-        signature=mlflow.models.signature.infer_signature(X_train, y_train)
-        )
-    mlflow.autolog()
-    mlflow.end_run()
\ No newline at end of file
+    return dict(
+        serving_cost(model, X_test),
+        params=params,
+        n_samples=len(X_train),
+        rmse=float(np.sqrt(mean_squared_error(y_test, y_pred))),
+        fit_time=fit_time,
+    )
+
+
+def grid_candidates():
+    names = list(SEARCH_SPACE)
+    return [dict(zip(names, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+
+
+def random_candidates(n_trials, seed=42):
+    candidates = grid_candidates()
+    return random.Random(seed).sample(candidates, min(n_trials, len(candidates)))
+
+
+def run_search(search, n_trials, workers, data, policy):
+    """
+        Run the trials across a pool of processes.
+
+        "grid" tries every combination of SEARCH_SPACE and "random" n_trials of
+        them. "halving" starts n_trials candidates on a fraction of the training
+        rows and keeps the best third of them for each larger fraction, up to
+        the whole training set. Returns the results of every trial and the trial
+        on the whole training set chosen by select_trial with the policy
+        (None when none fits the budgets).
+    """
+    X_train = data[0]
+    candidates = grid_candidates() if search == "grid" else random_candidates(n_trials)
+    if search == "halving":
+        rungs = max(1, math.ceil(math.log(len(candidates), 3)))
+        sample_sizes = [max(100, len(X_train) // 3 ** (rungs - 1 - rung)) for rung in range(rungs)]
+    else:
+        sample_sizes = [len(X_train)]
+
+    results = []
+    # Each trial trains a single-threaded forest: the pool gives the parallelism
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=data) as executor:
+        for rung, n_samples in enumerate(sample_sizes):
+            rung_results = list(executor.map(run_trial, candidates, [n_samples] * len(candidates)))
+            for result in rung_results:
+                result["rung"] = rung
+            results.extend(rung_results)
+            rung_results.sort(key=lambda result: result["rmse"])
+            candidates = [result["params"] for result in rung_results[:max(1, math.ceil(len(rung_results) / 3))]]
+    best = select_trial([result for result in results if result["rung"] == len(sample_sizes) - 1], **policy)
+    return results, best
+
+
+def log_trial(index, result):
+    """
+        One nested run per trial, under the training run.
+    """
+    with mlflow.start_run(run_name=f"trial-{index}", nested=True):
+        mlflow.log_params(result["params"])
+        log_param("rung", result["rung"])
+        log_metric("n_samples", result["n_samples"])
+        log_metric("rmse", result["rmse"])
+        log_metric("fit_time", result["fit_time"])
+        for name in ["predict_latency_ms", "batch_latency_ms", "model_size_mb", "peak_memory_mb"]:
+            log_metric(name, result[name])
+
+
+def row_range(value):
+    """
+        Rows of the --rows option: "start:stop", either bound optional, or "start" for start:.
+    """
+    bounds = value.split(":") if ":" in value else [value, ""]
+    try:
+        start, stop = [int(bound) if bound.strip() else None for bound in bounds]
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected start:stop (e.g. 1000000:), got {value!r}")
+    return start or 0, stop
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the pricing model and register it in MLflow")
+    parser.add_argument("--search", choices=["none", "grid", "random", "halving"], default="none",
+                        help="Hyperparameter search (none: train the default forest)")
+    parser.add_argument("--trials", type=int, default=20, help="Candidates of the random and halving searches")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Processes running the trials")
+    parser.add_argument("--max-latency-ms", type=float, default=MAX_LATENCY_MS, help="Single-row latency budget, 0 for none")
+    parser.add_argument("--max-size-mb", type=float, default=MAX_MODEL_SIZE_MB, help="Serialized model size budget, 0 for none")
+    parser.add_argument("--rmse-tolerance", type=float, default=RMSE_TOLERANCE,
+                        help="Relative RMSE above the best accepted for a faster model (e.g. 0.01)")
+    parser.add_argument("--data", default=DATA_PATH, help="Training data, CSV or Parquet")
+    parser.add_argument("--sample", type=float, help="Fraction of the rows kept (e.g. 0.1)")
+    parser.add_argument("--rows", type=row_range, default=(0, None),
+                        help="Rows used, as start:stop (e.g. 1000000: for the newest rows, a single number means start:)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Rows read at once")
+    args = parser.parse_args()
+    start, stop = args.rows
+    policy = {"max_latency_ms": args.max_latency_ms, "max_size_mb": args.max_size_mb, "rmse_tolerance": args.rmse_tolerance}
+
+    # Load .env file
+    load_dotenv()
+    print("MLFLOW_TRACKING_URI =", os.getenv("MLFLOW_TRACKING_URI"))
+
+    # Set tracking URI to our Hugging Face application
+    mlflow.set_tracking_uri(os.getenv("MLFLOW_TRACKING_URI"))
+
+    # Mlfow experiment setup
+    experiment_name = "get_around_price_prediction"
+    mlflow.set_experiment(experiment_name)
+
+    with mlflow.start_run():
+
+        print("training model ...")
+        start_time = time.time()
+
+        # Load data, chunk by chunk with compact dtypes
+        data = load_dataset(args.data, sample=args.sample, start=start, stop=stop, chunksize=args.chunk_size)
+        print(f"{len(data)} rows, {data.memory_usage(deep=True).sum() / 1e6:.1f} MB in memory")
+
+        # Prepare featueres and label
+        X=data.drop(columns='rental_price_per_day')
+        y=data['rental_price_per_day']
+
+        # Fixed lookup table for the categorical variables
+        lookup_table = build_lookup_table(X)
+
+        # Split
+        X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+
+        # Search the hyperparameters, one nested run per trial
+        params = DEFAULT_PARAMS
+        if args.search != "none":
+            print(f"{args.search} search with {args.workers} workers ...")
+            results, best = run_search(args.search, args.trials, args.workers, (X_train, X_test, y_train, y_test, lookup_table), policy)
+            for index, result in enumerate(results):
+                log_trial(index, result)
+            log_param("search", args.search)
+            log_metric("trials", len(results))
+            if best is None:
+                # Nothing fits the budgets: train the most accurate trial, it is not registered below
+                best = min((result for result in results if result["n_samples"] == len(X_train)), key=lambda result: result["rmse"])
+            params = best["params"]
+            print(f"{len(results)} trials, selected: {params} (rmse {best['rmse']:.2f}, {best['predict_latency_ms']:.2f} ms)")
+
+        # Train one pipeline: encode categorical variables, standardize, predict
+        model = build_pipeline(lookup_table, params)
+        model.fit(X_train, y_train)
+        # The API encodes requests with the lookup table of this encoder, checked by API/benchmarks/check_encoding.py
+
+        # Preidct and evaluate
+        y_pred = model.predict(X_test)
+        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+
+        # Log metrics, the serving cost is measured again without the trials running alongside
+        cost = serving_cost(model, X_test)
+        log_metric("rmse", rmse)
+        for name, value in cost.items():
+            log_metric(name, value)
+        log_metric("execution_time", time.time() - start_time)
+
+        # Log parameters
+        mlflow.log_params(params)
+        log_param("random_state", 42)
+        log_param("scaler", "StandardScaler")
+        log_param("label_encoders", ",".join(CATEGORICAL_COLUMNS))
+        mlflow.log_params({name: value for name, value in policy.items() if value})
+
+
+        # Log artifacts, the data only if this content was never uploaded
+        log_dataset(args.data, sample=args.sample, rows=f"{start}:{'' if stop is None else stop}" if (start, stop) != (0, None) else None)
+        log_metric("data_rows", len(data))
+        mlflow.log_dict(lookup_table, "encoding.json")
+
+
+        # Registration policy: a model over the budgets is logged but not registered
+        registered = within_budget(cost, args.max_latency_ms, args.max_size_mb)
+        mlflow.set_tag("registered", registered)
+        if not registered:
+            print(f"Model over budget ({cost['predict_latency_ms']:.2f} ms, {cost['model_size_mb']:.1f} MB): not registered")
+
+        # Log model
+        mlflow.sklearn.log_model(
+            model, "model",
+            registered_model_name="get_around_price_prediction" if registered else None,
+            signature=mlflow.models.signature.infer_signature(X_train, y_train),
+            serialization_format=mlflow.sklearn.SERIALIZATION_FORMAT_CLOUDPICKLE,
+            )
+        mlflow.autolog()
+        mlflow.end_run()
+
+
+if __name__ == "__main__":
+    main()
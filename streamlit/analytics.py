@@ -0,0 +1,146 @@
+"""
+    Aggregates of the dashboard, memoized on the dataset version and their parameters.
+
+    Every function takes the version of the data (data_version()) and only reads the rentals on a cache miss, so a rerun of the dashboard
+    that only changes a widget finds every figure in the cache without
+    scanning the data.
+"""
+import numpy as np
+import streamlit as st
+
+from chains import build_chains, chain_summary
+from data_cache import load_delay_data, source_version
+from revenue import load_car_prices, prices_version, rental_revenue
+from thresholds import ThresholdIndex
+
+
+# ---------------- Data ----------------
+def data_version():
+    """
+        Version of the delay data and of the car prices: a cheap stat of both files.
+    """
+    return source_version(), prices_version()
+
+
+# Load data, from the Parquet copy of the Excel file (built on the first load)
+@st.cache_data(max_entries=2)
+def load_data(version):
+    df, _ = load_delay_data()
+    return df
+
+
+# Index of the delays between rentals, with their revenue when every car is priced, shared by all the sessions
+@st.cache_resource(max_entries=2)
+def load_threshold_index(version):
+    data = load_data(version)
+    car_prices = load_car_prices()
+    return ThresholdIndex(data, rental_revenue(data, car_prices) if car_prices is not None else None)
+
+
+# ---------------- Thresholds ----------------
+@st.cache_data(max_entries=256)
+def threshold_analysis(version, threshold):
+    return load_threshold_index(version).analyze(threshold)
+
+
+@st.cache_data(max_entries=32)
+def threshold_sweep(version, max_threshold, step):
+    return load_threshold_index(version).sweep(np.arange(0, max_threshold + 1, step))
+
+
+# ---------------- Distributions ----------------
+@st.cache_data(max_entries=32)
+def histogram(version, column, nbins, clip_quantiles=None):
+    """
+        Counts of the values of the column (missing values ignored) in nbins
+        equal bins. With clip_quantiles=(low, high) the bins only cover the
+        values between these quantiles and the outliers are left out.
+        Returns the bin edges, the counts and the number of values left out.
+    """
+    values = load_data(version)[column].to_numpy(np.float64)
+    values = values[~np.isnan(values)]
+    value_range = tuple(np.quantile(values, clip_quantiles)) if clip_quantiles is not None else None
+    counts, edges = np.histogram(values, bins=nbins, range=value_range)
+    return edges, counts, len(values) - int(counts.sum())
+
+
+@st.cache_data(max_entries=8)
+def category_counts(version, column):
+    return load_data(version)[column].value_counts()
+
+
+# ---------------- Delays ----------------
+@st.cache_data(max_entries=2)
+def state_shares(version):
+    """
+        Percentage of the rentals in each state.
+    """
+    return load_data(version)["state"].value_counts(normalize=True) * 100
+
+
+@st.cache_data(max_entries=2)
+def delayed_checkouts(version):
+    """
+        Percentage of the rentals returned late, and the share of each check-in type among them.
+    """
+    data = load_data(version)
+    # Select only the rentals with a delay at checkout
+    delayed_checkouts = data[['delay_at_checkout_in_minutes', 'checkin_type']].dropna()
+    positive_delays = delayed_checkouts[delayed_checkouts['delay_at_checkout_in_minutes'] > 0]
+
+    # Total of rentals with a delay
+    total_delayed_rentals = len(positive_delays)
+
+    # Select only the rentals with a delay at checkout and a check-in type
+    delayed_connect = positive_delays[positive_delays['checkin_type'] == 'connect']
+    delayed_mobile = positive_delays[positive_delays['checkin_type'] == 'mobile']
+
+    # Compute the percentage of delayed rentals
+    percentage_delayed = (total_delayed_rentals / len(delayed_checkouts)) * 100
+
+    # Compute the percentage of delayed rentals for each check-in type
+    percentage_delayed_connect = (len(delayed_connect) / total_delayed_rentals * 100) if total_delayed_rentals > 0 else 0
+    percentage_delayed_mobile = (len(delayed_mobile) / total_delayed_rentals * 100) if total_delayed_rentals > 0 else 0
+
+    return percentage_delayed, percentage_delayed_connect, percentage_delayed_mobile
+
+
+@st.cache_data(max_entries=2)
+def next_driver_impact(version):
+    """
+        Percentage of the rentals starting before the previous one ended, and
+        number of cancelled rentals with a delay and a previous rental.
+    """
+    data = load_data(version)
+    deltas = data['time_delta_with_previous_rental_in_minutes']
+    impacted_next_rentals = data[deltas.notna() & (deltas < 0)]
+    percentage_impacted = len(impacted_next_rentals) / len(data) * 100
+
+    nb_cancelled_rentals = data[(data['state'] == 'cancelled') &
+                        (data['delay_at_checkout_in_minutes'] > 0) &
+                        (data['previous_ended_rental_id'].notna())]
+    return percentage_impacted, len(nb_cancelled_rentals)
+
+
+# ---------------- Rental chains ----------------
+@st.cache_data(max_entries=2)
+def rental_chains(version):
+    """
+        Every rental joined to its previous rental (see chains.build_chains).
+    """
+    return build_chains(load_data(version))
+
+
+@st.cache_data(max_entries=2)
+def rental_chains_summary(version):
+    return chain_summary(rental_chains(version))
+
+
+@st.cache_data(max_entries=2)
+def impacted_rentals(version):
+    """
+        Rentals whose driver waited for the car, longest waits first.
+    """
+    chains = rental_chains(version)
+    return chains[chains["impacted"]].sort_values("wait_minutes", ascending=False).reset_index(drop=True)
+
@@ -0,0 +1,152 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# Space of API
+URL_BASE = os.getenv("PRICING_API_URL", "https://andrianiniaina-api-space-1f33d3f.hf.space/")
+
+# Seconds to connect and to wait for an answer
+CONNECT_TIMEOUT = float(os.getenv("PRICING_API_CONNECT_TIMEOUT", "3.05"))
+READ_TIMEOUT = float(os.getenv("PRICING_API_READ_TIMEOUT", "30"))
+
+# Retries of a call that could not connect or got a 429 or 5xx answer, waiting
+# backoff_factor * 2 ** (retry - 1) seconds between them. A read timeout is not retried.
+MAX_RETRIES = int(os.getenv("PRICING_API_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("PRICING_API_BACKOFF", "0.5"))
+
+# Predictions kept in memory, 0 to disable the cache
+CLIENT_CACHE_SIZE = int(os.getenv("PRICING_API_CACHE_SIZE", "1024"))
+
+# Seconds a prediction is kept: the API swaps in a new model version
+# (checked every MODEL_REFRESH_SECONDS, 300 by default) without the client knowing
+CLIENT_CACHE_TTL = float(os.getenv("PRICING_API_CACHE_TTL", "300"))
+
+# Rows per call of /predict/batch (MAX_BATCH_SIZE of the API)
+BATCH_SIZE = 10000
+
+
+def features_key(features):
+    """
+        Canonical key of a features dict: same features, same key, whatever the order.
+    """
+    return json.dumps(features, sort_keys=True, ensure_ascii=False)
+
+
+# ---------------- Client ----------------
+class PricingClient:
+    """
+        Client of the pricing API, shared by all the sessions of the dashboard.
+
+        Calls go through one requests.Session, so the TLS connection to the
+        API is kept alive and reused instead of opened for every click. Every
+        call has a timeout, failed calls (connection errors, 429 and 5xx
+        answers) are retried with an exponential backoff, and the predictions
+        are kept cache_ttl seconds in a small LRU cache keyed on the features,
+        so a new model version is picked up without a restart. A call that
+        timed out waiting for the answer is not retried: the API may still be
+        working on it, and a click must not wait for several timeouts. predict_batch()
+        prices many cars with one call of /predict/batch per batch_size rows.
+    """
+
+    def __init__(self, base_url=URL_BASE, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), retries=MAX_RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, cache_size=CLIENT_CACHE_SIZE, cache_ttl=CLIENT_CACHE_TTL, pool_size=10):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.cache_size = cache_size
+        self.cache_ttl = cache_ttl
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.session = requests.Session()
+        retry = Retry(
+            total=retries,
+            connect=retries,
+            read=0,
+            status=retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            # POST included: the API answers connection errors and 5xx before predicting
+            allowed_methods=None,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _cached(self, key):
+        with self._lock:
+            if key in self._cache:
+                price, expires = self._cache[key]
+                if expires > time.monotonic():
+                    self._cache.move_to_end(key)
+                    return price
+                del self._cache[key]
+        return None
+
+    def _store(self, key, price):
+        if self.cache_size <= 0:
+            return
+        with self._lock:
+            self._cache[key] = (price, time.monotonic() + self.cache_ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _post(self, path, payload):
+        response = self.session.post(f"{self.base_url}{path}", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def predict(self, features):
+        """
+            Predicted price of one car, None when the API could not price it.
+        """
+        key = features_key(features)
+        price = self._cached(key)
+        if price is not None:
+            return price
+        try:
+            result = self._post("/predict", features)
+        except (requests.RequestException, ValueError):
+            return None
+        # The API answers errors with a 200 and an "error" field
+        price = result.get("predicted_price")
+        if price is not None:
+            self._store(key, price)
+        return price
+
+    def predict_batch(self, features_list, batch_size=BATCH_SIZE, workers=1):
+        """
+            Predicted prices of many cars, in the order given. Only the
+            features not in the cache are sent, batch_size rows per call,
+            workers calls at a time. Raises requests.RequestException when a
+            call still fails after the retries.
+        """
+        keys = [features_key(features) for features in features_list]
+        prices = [self._cached(key) for key in keys]
+        missing = {}
+        for key, features, price in zip(keys, features_list, prices):
+            if price is None:
+                missing.setdefault(key, features)
+        missing_keys = list(missing)
+        batches = [missing_keys[start:start + batch_size] for start in range(0, len(missing_keys), batch_size)]
+
+        def send(batch):
+            return self._post("/predict/batch", [missing[key] for key in batch])["predicted_prices"]
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for batch, batch_prices in zip(batches, executor.map(send, batches)):
+                for key, price in zip(batch, batch_prices):
+                    self._store(key, price)
+                    missing[key] = price
+        return [price if price is not None else missing[key] for key, price in zip(keys, prices)]
+
+    def close(self):
+        self.session.close()
@@ -8,11 +8,14 @@ import plotly.graph_objects as go
 # Data visualization
 import plotly.express as px
 
-# Requests
-import requests
-
 import os
 
+# Delay data and its aggregates, cached per version of the data
+import analytics
+
+# Client of the pricing API
+from api_client import PricingClient, URL_BASE
+
 # Page configuration
 st.set_page_config(
     page_title="Getaround Space",
@@ -31,21 +34,25 @@ data = st.sidebar.checkbox("Show data", key="raw_data_checkbox")
 data_analysis = st.sidebar.checkbox("Data Analysis", key="data_analysis_checkbox")
 machine_learning = st.sidebar.checkbox("Machine Learning", key="machine_learning_checkbox")
 
-# Load data
-@st.cache_data
-def load_data():
-    df = pd.read_excel("get_around_delay_analysis.xlsx")
-    return df
-
 if data :
     # If data show raw data and some visualizations
     st.markdown("<h3 style='color: #00DDD1; font-weight: bold;'>Data</h3>",unsafe_allow_html=True)
     st.subheader("Loading data...")
-    data = load_data()
+    version = analytics.data_version()
 
     # Display the data
     if st.checkbox("Show raw data") :
-        st.write(data)
+        st.write(analytics.load_data(version))
+
+    # Histograms binned here: the charts only receive the bins, not the rentals
+    def histogram_figure(edges, counts, color=None):
+        fig = go.Figure(go.Bar(
+            x=(edges[:-1] + edges[1:]) / 2,
+            y=counts,
+            marker_color=color,
+            hovertext=[f"{low:g} to {high:g}" for low, high in zip(edges[:-1], edges[1:])]
+        ))
+        return fig
 
     # Visualizations
     with st.expander("See visualizations") :
@@ -59,28 +66,24 @@ if data :
         # Tab 1 : Visualization of the distribution of checkout delays
         with tab1 :
             st.subheader("Distribution of checkout delays")
-            fig1 = px.histogram(
-                data, 
-                x="delay_at_checkout_in_minutes", 
-                histfunc="count",
-                nbins=100
-            )
+            clip1 = st.checkbox("Leave out the outliers (below the 1st and above the 99th percentile)", value=False, key="clip_delays")
+            edges, counts, left_out = analytics.histogram(version, "delay_at_checkout_in_minutes", 100, (0.01, 0.99) if clip1 else None)
+            fig1 = histogram_figure(edges, counts)
             fig1.update_layout(
                 xaxis_title="Delay (minutes)",
                 yaxis_title="Frequency",
                 bargap=0.1
             )
             st.plotly_chart(fig1)
+            if left_out:
+                st.caption(f"{left_out} rentals outside the range are left out.")
 
         # Tab 2 : Visualization of the time distribution between two rentals
         with tab2:
             st.subheader("Time distribution between two rentals")
-            fig2 = px.histogram(
-                data, 
-                x="time_delta_with_previous_rental_in_minutes", 
-                nbins=30, 
-                color_discrete_sequence=["#00DDD1"]  
-            )
+            clip2 = st.checkbox("Leave out the outliers (below the 1st and above the 99th percentile)", value=False, key="clip_deltas")
+            edges, counts, left_out = analytics.histogram(version, "time_delta_with_previous_rental_in_minutes", 30, (0.01, 0.99) if clip2 else None)
+            fig2 = histogram_figure(edges, counts, "#00DDD1")
             fig2.update_layout(
                 xaxis_title="Time (minutes)",
                 yaxis_title="Frequency",
@@ -88,16 +91,18 @@ if data :
                 showlegend=False
             )
             st.plotly_chart(fig2)
+            if left_out:
+                st.caption(f"{left_out} rentals outside the range are left out.")
 
         # Tab 3 : Visualization of the distribution of check-in types
         with tab3:
             st.subheader("Distribution of check-in types")
-            fig3 = px.histogram(
-                data,
-                x="checkin_type",
-                nbins=30,
-                color_discrete_sequence=["#93D7C5"]
-            )
+            checkin_counts = analytics.category_counts(version, "checkin_type")
+            fig3 = go.Figure(go.Bar(
+                x=checkin_counts.index,
+                y=checkin_counts.values,
+                marker_color="#93D7C5"
+            ))
             fig3.update_layout(
                 xaxis_title="Check-in type",
                 yaxis_title="Frequency",
@@ -109,7 +114,7 @@ if data :
         # Tab 4 : Visualization of the rental statuses
         with tab4:
             st.subheader("Distribution of rental statuses")
-            state_counts = data["state"].value_counts(normalize=True) * 100
+            state_counts = analytics.state_shares(version)
             color_mapping = {
                 "ended": "#00DDD1",
                 "cancelled": "#93D7C5"
@@ -138,57 +143,32 @@ if data_analysis :
     # st.write("The following graphs can help us answer these questions:")
     st.write("To answer these following questions, let's initiallize the thershold for the delay at checkout.")
 
-    data = load_data()
+    version = analytics.data_version()
     threshold1 = st.number_input("Thershold for delay at checkout (minutes)", min_value=0, max_value=720, value=0, step=30, key="threshold1")
 
-    # Function to analyze rentals based on a threshold
-    def analyze_rentals_threshold(data, threshold):
-        """
-        Analyzes the impact of an arbitrary threshold on rentals.
-
-        Parameters:
-        - data: DataFrame containing the rentals
-        - threshold: Threshold in minutes to filter rentals
-
-        Returns:
-        - Percentage of rentals affected for each check-in type
-        - Number of problem cases resolved
-        """
-        # Filter rentals based on the given threshold
-        affected_rentals = data[data['time_delta_with_previous_rental_in_minutes'] < threshold]
-                
-        # Calculation of rentals affected by check-in type
-        affected_rentals_connect = affected_rentals[affected_rentals['checkin_type'] == 'connect']
-        affected_rentals_mobile = affected_rentals[affected_rentals['checkin_type'] == 'mobile']
-        
-        # Calculation of the percentage of rentals affected by check-in type
-        total_rentals_connect = (data['checkin_type'] == 'connect').sum()
-        total_rentals_mobile = (data['checkin_type'] == 'mobile').sum()
-        
-        percentage_affected_connect = (len(affected_rentals_connect) / total_rentals_connect * 100) if total_rentals_connect > 0 else 0
-        percentage_affected_mobile = (len(affected_rentals_mobile) / total_rentals_mobile * 100) if total_rentals_mobile > 0 else 0
-        
-        # Calculation of resolved problem cases for each check-in type
-        problem_cases_resolved_connect = affected_rentals_connect[affected_rentals_connect['delay_at_checkout_in_minutes'] > 0]
-        problem_cases_resolved_mobile = affected_rentals_mobile[affected_rentals_mobile['delay_at_checkout_in_minutes'] > 0]
-        
-        return percentage_affected_connect, percentage_affected_mobile, problem_cases_resolved_connect, problem_cases_resolved_mobile, affected_rentals_connect, affected_rentals_mobile, affected_rentals, total_rentals_connect, total_rentals_mobile
-
-    # Call function to analyze rentals based on the threshold
-    percentage_affected_connect, percentage_affected_mobile, problem_cases_resolved_connect, problem_cases_resolved_mobile, affected_rentals, affected_rentals_connect, affected_rentals_mobile, total_rentals_connect, total_rentals_mobile = analyze_rentals_threshold(data, threshold1)
+    # Figures for the threshold, from the index of the delays built once per dataset
+    analysis = analytics.threshold_analysis(version, threshold1)
+    percentage_affected_connect = analysis["percentage_affected_connect"]
+    percentage_affected_mobile = analysis["percentage_affected_mobile"]
+    affected_rentals_connect = analysis["affected_rentals_connect"]
+    affected_rentals_mobile = analysis["affected_rentals_mobile"]
+    problem_cases_resolved_connect = analysis["problem_cases_resolved_connect"]
+    problem_cases_resolved_mobile = analysis["problem_cases_resolved_mobile"]
+    # Estimated with the daily price of the cars, when every car was priced (see revenue.py)
+    revenue_estimated = "percentage_revenue_affected_connect" in analysis
 
     col1, col2, col3 = st.columns([2, 2, 4])
 
     with col1:
         st.metric(
             "Rentals with a delay (Connect)", 
-            len(affected_rentals_connect),
-            delta=len(affected_rentals_connect) - len(affected_rentals_mobile)
+            affected_rentals_connect,
+            delta=affected_rentals_connect - affected_rentals_mobile
         )
         st.metric(
             "Rentals with a delay (Mobile)", 
-            len(affected_rentals_mobile),
-            delta=len(affected_rentals_mobile) - len(affected_rentals_connect)
+            affected_rentals_mobile,
+            delta=affected_rentals_mobile - affected_rentals_connect
         )
     with col2:
         st.metric(
@@ -224,13 +204,17 @@ if data_analysis :
         with col1 :
             st.write("By defining the thresholds above, we can see the different revenue shares that could be affected by the threshold's implementation, depending on the check-in type used.")
             st.write("Part of owner's revenue impacted by threshold")
+            if revenue_estimated:
+                st.caption("Revenue of the ended rentals at the daily price of their car (see revenue.py).")
+            else:
+                st.caption("The cars of the delay data are not all priced (see revenue.py): share of the rentals affected.")
             col2.metric(
                 "With connect check-in type",
-                f"{percentage_affected_connect:.2f}%",
+                f"{analysis['percentage_revenue_affected_connect'] if revenue_estimated else percentage_affected_connect:.2f}%",
             )
             col2.metric(
                 "With mobile check-in type",
-                f"{percentage_affected_mobile:.2f}%",
+                f"{analysis['percentage_revenue_affected_mobile'] if revenue_estimated else percentage_affected_mobile:.2f}%",
             )
 
     # Question 2
@@ -238,40 +222,20 @@ if data_analysis :
         col1, col2 = st.columns(2)
         col1.metric(
             "Rentals with a delay (Connect)", 
-            int(len(affected_rentals_connect)), 
-            delta=int(len(affected_rentals_connect) - len(affected_rentals_mobile))
+            int(affected_rentals_connect), 
+            delta=int(affected_rentals_connect - affected_rentals_mobile)
         )
         col2.metric(
             "Rentals with a delay (Mobile)", 
-            int(len(affected_rentals_mobile)), 
-            delta=int(len(affected_rentals_mobile) - len(affected_rentals_connect))
+            int(affected_rentals_mobile), 
+            delta=int(affected_rentals_mobile - affected_rentals_connect)
         )
     
     # Question 3
     with st.expander("3- How often are drivers late for the next check-in? ") :
         
-        def impacted_next_rentals():
-            # Select only the rentals with a delay at checkout
-            delayed_checkouts = data[['delay_at_checkout_in_minutes', 'checkin_type']].dropna()
-            positive_delays = delayed_checkouts[delayed_checkouts['delay_at_checkout_in_minutes'] > 0]
-            
-            # Total of rentals with a delay
-            total_delayed_rentals = len(positive_delays)
-            
-            # Select only the rentals with a delay at checkout and a check-in type
-            delayed_connect = positive_delays[positive_delays['checkin_type'] == 'connect']
-            delayed_mobile = positive_delays[positive_delays['checkin_type'] == 'mobile']
-
-            # Compute the percentage of delayed rentals
-            percentage_delayed = (total_delayed_rentals / len(delayed_checkouts)) * 100
-
-            # Compute the percentage of delayed rentals for each check-in type
-            percentage_delayed_connect = (len(delayed_connect) / total_delayed_rentals * 100) if total_delayed_rentals > 0 else 0
-            percentage_delayed_mobile = (len(delayed_mobile) / total_delayed_rentals * 100) if total_delayed_rentals > 0 else 0
-
-            return percentage_delayed, percentage_delayed_connect, percentage_delayed_mobile
         # Retrieve values
-        percentage_delayed, percentage_delayed_connect, percentage_delayed_mobile = impacted_next_rentals()
+        percentage_delayed, percentage_delayed_connect, percentage_delayed_mobile = analytics.delayed_checkouts(version)
 
         # Display the results
         col1, col2 = st.columns(2)
@@ -311,9 +275,8 @@ if data_analysis :
             \n Customer service often reports users unsatisfied because they had to wait for the car to come back from the previous rental
         """)
 
-        # Select only the rentals with a delay at checkout and a check-in type
-        impacted_next_rentals = data[data['time_delta_with_previous_rental_in_minutes'].notna() & (data['time_delta_with_previous_rental_in_minutes'] < 0)]
-        percentage_impacted = len(impacted_next_rentals) / len(data) * 100
+        # Rentals starting before the previous one ended, cancelled rentals with a previous rental
+        percentage_impacted, nb_cancelled_rentals = analytics.next_driver_impact(version)
         
         col1, col2 = st.columns(2)
         with col1 :
@@ -327,13 +290,35 @@ if data_analysis :
                 f"{percentage_impacted:.2f}%"
             )
         
-        nb_cancelled_rentals = data[(data['state'] == 'cancelled') &
-                            (data['delay_at_checkout_in_minutes'] > 0) &
-                            (data['previous_ended_rental_id'].notna())]
         st.markdown(
-            f"<span style='color: blue;'>According to our data, for any rental with a 'cancelled' status with a previous completed rental recorded is: {len(nb_cancelled_rentals)}</span>",
+            f"<span style='color: blue;'>According to our data, for any rental with a 'cancelled' status with a previous completed rental recorded is: {nb_cancelled_rentals}</span>",
             unsafe_allow_html=True
         )
+        st.divider()
+
+        # Each rental joined to the previous rental of the car
+        st.markdown("""
+            Joining each rental to the previous rental of the same car tells how much of the previous delay was absorbed by the time planned between the two rentals,
+            and how long the next driver actually waited for the car.
+        """)
+        chains_summary = analytics.rental_chains_summary(version)
+        col1, col2, col3, col4 = st.columns(4)
+        col1.metric("Rentals following a known previous rental", chains_summary["previous_delay_known"])
+        col2.metric(
+            "Drivers who waited for the car",
+            chains_summary["impacted"],
+            delta=f"{chains_summary['percentage_impacted']:.2f}%",
+            delta_color="off"
+        )
+        col3.metric("Median wait (minutes)", f"{chains_summary['median_wait_minutes']:.0f}")
+        col4.metric("Rentals canceled after a wait", chains_summary["impacted_canceled"])
+        st.write(
+            f"In {chains_summary['buffer_used']} cases the previous delay used part of the planned time between the two rentals. "
+            f"{chains_summary['cascades']} waits cascaded from a rental that had itself started late "
+            f"(longest cascade: {chains_summary['longest_cascade']} rentals in a row)."
+        )
+        if st.checkbox("Show the rentals whose driver waited", key="show_impacted_rentals"):
+            st.dataframe(analytics.impacted_rentals(version))
     
     # Question 5
     with st.expander("5- How many problematic cases will it solve depending on the chosen threshold and scope?"):
@@ -354,20 +339,74 @@ if data_analysis :
         # Display the results based on the selected check-in type
         st.write(f"Number of problematic cases resolved")
         if checkin_type == ":rainbow[Connect]":
-            resolved_case = len(problem_cases_resolved_connect)
+            resolved_case = problem_cases_resolved_connect
             st.write(f"With threshold of {threshold1} minutes and checkin type Connect")
             st.metric(
                 "Number of problem cases resolved (Connect)",
                 f"{resolved_case}",
             )
         elif checkin_type == ":rainbow[Mobile]":
-            resolved_case = len(problem_cases_resolved_mobile)
+            resolved_case = problem_cases_resolved_mobile
             st.write(f"With threshold of {threshold1} minutes and checkin type Mobile")
             st.metric(
                 "Number of problem cases resolved (Mobile)",
                 f"{resolved_case}",
             )
 
+    # Threshold sweep
+    with st.expander("Threshold sweep: the trade-off for every threshold"):
+        st.write("Share of rentals affected and problem cases resolved for every threshold, by scope of the feature.")
+        col1, col2 = st.columns(2)
+        with col1:
+            max_threshold = st.slider("Maximum threshold (minutes)", min_value=30, max_value=720, value=720, step=30, key="sweep_max_threshold")
+        with col2:
+            sweep_step = st.select_slider("Step (minutes)", options=[1, 5, 10, 15, 30], value=1, key="sweep_step")
+
+        sweep = analytics.threshold_sweep(version, max_threshold, sweep_step)
+        scope_colors = {"connect": "#00DDD1", "mobile": "#93D7C5", "all": "#4A4A4A"}
+
+        fig_sweep_affected = px.line(
+            sweep,
+            x="threshold",
+            y="percentage_affected",
+            color="scope",
+            color_discrete_map=scope_colors,
+            title="Percentage of rentals affected by threshold"
+        )
+        fig_sweep_affected.update_layout(xaxis_title="Threshold (minutes)", yaxis_title="Rentals affected (%)")
+        st.plotly_chart(fig_sweep_affected)
+
+        fig_sweep_resolved = px.line(
+            sweep,
+            x="threshold",
+            y="problem_cases_resolved",
+            color="scope",
+            color_discrete_map=scope_colors,
+            title="Problem cases resolved by threshold"
+        )
+        fig_sweep_resolved.update_layout(xaxis_title="Threshold (minutes)", yaxis_title="Problem cases resolved")
+        st.plotly_chart(fig_sweep_resolved)
+
+        if "percentage_revenue_affected" in sweep:
+            fig_sweep_revenue = px.line(
+                sweep,
+                x="threshold",
+                y="percentage_revenue_affected",
+                color="scope",
+                color_discrete_map=scope_colors,
+                title="Percentage of the owners' revenue affected by threshold"
+            )
+            fig_sweep_revenue.update_layout(xaxis_title="Threshold (minutes)", yaxis_title="Revenue affected (%)")
+            st.plotly_chart(fig_sweep_revenue)
+
+        st.download_button(
+            "Download the sweep (CSV)",
+            data=sweep.to_csv(index=False),
+            file_name="threshold_sweep.csv",
+            mime="text/csv",
+            key="sweep_download"
+        )
+
     # Conclusion
     with st.expander("Conclusion") :
         st.markdown("""
@@ -381,18 +420,14 @@ if data_analysis :
 if machine_learning :
     st.markdown("<h3 style='color: #00DDD1; font-weight: bold;'>Pricing Prediction</h3>",unsafe_allow_html=True)
 
-    # Space of API
-    URL_BASE = "https://andrianiniaina-api-space-1f33d3f.hf.space/"      
+    # API client, one pooled session and one prediction cache shared by all the sessions
+    @st.cache_resource
+    def get_client():
+        return PricingClient(URL_BASE)
 
     # API
     def get_prediction(data):
-        response = requests.post(f"{URL_BASE}/predict", json=data)
-        # st.write("Raw API response:", response.text)
-        if response.status_code == 200:
-            result = response.json()
-            return result["predicted_price"]
-        else:
-            return None
+        return get_client().predict(data)
 
     # Layout
     row1 = st.columns(1)
@@ -0,0 +1,99 @@
+"""
+    Rental chains: check build_chains against a merge and a loop over the
+    chains on the delay data, then time it on synthetic rental histories.
+
+    Usage (from the streamlit folder):
+        python benchmarks/bench_chains.py --rentals 1000000,5000000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chains import build_chains, chain_summary
+from data_cache import load_delay_data
+
+
+def reference_chains(data):
+    """
+        Same figures with a merge on rental_id and a Python walk along each chain.
+    """
+    merged = data.merge(
+        data[["rental_id", "delay_at_checkout_in_minutes"]].rename(
+            columns={"rental_id": "previous_ended_rental_id", "delay_at_checkout_in_minutes": "previous_delay"}
+        ),
+        on="previous_ended_rental_id", how="left",
+    )
+    linked = merged["previous_ended_rental_id"].isin(data["rental_id"])
+    late = merged["previous_delay"].clip(lower=0).fillna(0)
+    wait = (late - merged["time_delta_with_previous_rental_in_minutes"].fillna(0)).clip(lower=0).where(linked)
+    impacted = dict(zip(merged["rental_id"], wait.fillna(0) > 0))
+    previous = dict(zip(merged["rental_id"], merged["previous_ended_rental_id"].where(linked)))
+    cascade_length = {}
+    for rental_id in merged["rental_id"]:
+        length, current = 0, rental_id
+        while current in impacted and impacted[current]:
+            length += 1
+            current = previous[current]
+        cascade_length[rental_id] = length
+    return wait.to_numpy(), np.array([cascade_length[rental_id] for rental_id in merged["rental_id"]])
+
+
+def synthetic_rentals(n_rentals, seed=42):
+    """
+        Rentals of n_rentals / 20 cars, each car rented back to back with a
+        random buffer and random late returns, in a shuffled order.
+    """
+    rng = np.random.default_rng(seed)
+    n_cars = max(1, n_rentals // 20)
+    car_ids = np.sort(rng.integers(0, n_cars, n_rentals))
+    rental_ids = np.arange(n_rentals, dtype=np.int32) + 1
+    first = np.r_[True, car_ids[1:] != car_ids[:-1]]
+    # Only rentals close enough to the previous one are linked to it, as in the delay data
+    close = rng.random(n_rentals) < 0.6
+    previous = np.where(first | ~close, np.nan, np.r_[np.nan, rental_ids[:-1]])
+    data = pd.DataFrame({
+        "rental_id": rental_ids,
+        "car_id": car_ids.astype(np.int32),
+        "checkin_type": pd.Categorical(rng.choice(["connect", "mobile"], n_rentals)),
+        "state": pd.Categorical(rng.choice(["ended", "canceled"], n_rentals, p=[0.85, 0.15])),
+        "delay_at_checkout_in_minutes": rng.normal(0, 90, n_rentals).round().astype(np.float32),
+        "previous_ended_rental_id": previous,
+        "time_delta_with_previous_rental_in_minutes": np.where(np.isnan(previous), np.nan, rng.integers(0, 25, n_rentals) * 30).astype(np.float32),
+    })
+    return data.sample(frac=1, random_state=seed).reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rentals", default="1000000", type=lambda value: [int(n) for n in value.split(",")])
+    args = parser.parse_args()
+
+    data, _ = load_delay_data()
+    chains = build_chains(data)
+    wait, cascade_length = reference_chains(data)
+    if not np.array_equal(chains["wait_minutes"].to_numpy(), wait, equal_nan=True):
+        raise SystemExit("wait_minutes differs from the merge")
+    if not np.array_equal(chains["cascade_length"].to_numpy(), cascade_length):
+        raise SystemExit("cascade_length differs from the walk along the chains")
+    print(f"Same results as the merge on {len(data)} rentals: {chain_summary(chains)}")
+
+    for n_rentals in args.rentals:
+        synthetic = synthetic_rentals(n_rentals)
+        start_time = time.perf_counter()
+        chains = build_chains(synthetic)
+        elapsed = time.perf_counter() - start_time
+        summary = chain_summary(chains)
+        print(
+            f"{n_rentals:>10d} rentals: {elapsed:6.2f} s   longest chain {summary['longest_chain']}, "
+            f"{summary['impacted']} impacted, {summary['cascades']} cascades (longest {summary['longest_cascade']})"
+        )
+
+
+if __name__ == "__main__":
+    main()
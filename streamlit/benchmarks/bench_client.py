@@ -0,0 +1,176 @@
+"""
+    Prediction calls of the dashboard against a local stand-in of the pricing
+    API: a new connection per call (requests.post) against the pooled
+    PricingClient, its retries, its cache and its batch mode.
+
+    The stand-in answers /predict and /predict/batch like the API, after
+    --latency ms per call, and counts the calls and the TCP connections.
+
+    Usage (from the streamlit folder):
+        python benchmarks/bench_client.py --calls 200 --latency 5
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import PricingClient
+
+FEATURES = {
+    "model_key": "Citroën", "mileage": 140411, "engine_power": 100, "fuel": "diesel",
+    "paint_color": "black", "car_type": "convertible", "private_parking_available": True,
+    "has_gps": True, "has_air_conditioning": False, "automatic_car": False,
+    "has_getaround_connect": True, "has_speed_regulator": True, "winter_tires": True,
+}
+
+
+def fake_price(features):
+    return 100 + features["mileage"] % 50 + features["engine_power"] / 10
+
+
+# ---------------- Stand-in API ----------------
+class StandInAPI(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency):
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.latency = latency
+        self.failures = 0
+        self.calls = 0
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up waiting (read timeout) are expected
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def reset(self, failures=0):
+        with self.lock:
+            self.failures, self.calls, self.connections = failures, 0, 0
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.server.latency)
+        with self.server.lock:
+            self.server.calls += 1
+            failing = self.server.failures > 0
+            self.server.failures -= failing
+        if failing:
+            self.answer(503, {"detail": "Model is loading"})
+        elif self.path == "/predict":
+            self.answer(200, {"predicted_price": fake_price(body)})
+        elif self.path == "/predict/batch":
+            self.answer(200, {"predicted_prices": [fake_price(features) for features in body]})
+        else:
+            self.answer(404, {"detail": "Not Found"})
+
+    def answer(self, status, result):
+        payload = json.dumps(result).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+# ---------------- Measures ----------------
+def variants(n_calls):
+    return [dict(FEATURES, mileage=FEATURES["mileage"] + i) for i in range(n_calls)]
+
+
+def measure(server, name, call):
+    server.reset()
+    start_time = time.perf_counter()
+    result = call()
+    elapsed = time.perf_counter() - start_time
+    print(f"{name:<34s} {elapsed * 1000:9.1f} ms   {server.calls:5d} calls   {server.connections:5d} connections")
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=5, help="Milliseconds per call of the stand-in")
+    args = parser.parse_args()
+
+    server = StandInAPI(args.latency / 1000)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    features_list = variants(args.calls)
+    expected = [fake_price(features) for features in features_list]
+
+    def one_connection_per_call():
+        return [requests.post(f"{server.url}/predict", json=features, timeout=10).json()["predicted_price"]
+                for features in features_list]
+
+    client = PricingClient(server.url, backoff_factor=0.01)
+    prices = measure(server, "requests.post per call", one_connection_per_call)
+    assert prices == expected
+    prices = measure(server, "PricingClient.predict", lambda: [client.predict(features) for features in features_list])
+    assert prices == expected
+    prices = measure(server, "PricingClient.predict (cached)", lambda: [client.predict(features) for features in features_list])
+    assert prices == expected and server.calls == 0
+
+    client = PricingClient(server.url, backoff_factor=0.01)
+    prices = measure(server, "PricingClient.predict_batch", lambda: client.predict_batch(features_list))
+    assert prices == expected and server.calls == 1
+
+    client = PricingClient(server.url, backoff_factor=0.01, cache_size=0)
+    server.reset(failures=2)
+    price = client.predict(FEATURES)
+    print(f"{'2 answers 503, then 200':<34s} {server.calls:>16d} calls   price {price}")
+    assert price == fake_price(FEATURES)
+    server.reset(failures=10)
+    price = client.predict(FEATURES)
+    print(f"{'503 after every retry':<34s} {server.calls:>16d} calls   price {price}")
+    assert price is None
+
+    client = PricingClient(server.url, timeout=(1, 0.2), backoff_factor=0.01, cache_size=0)
+    server.reset()
+    server.latency = 0.5
+    start_time = time.perf_counter()
+    price = client.predict(FEATURES)
+    elapsed = time.perf_counter() - start_time
+    # Let the stand-in finish the call the client gave up on
+    time.sleep(0.5)
+    print(f"{'read timeout (0.2 s)':<34s} {server.calls:>16d} calls   price {price} after {elapsed:.2f} s")
+    assert price is None and elapsed < 0.4 and server.calls == 1
+    server.latency = args.latency / 1000
+
+    client = PricingClient(server.url, cache_ttl=0.2)
+    client.predict(FEATURES)
+    time.sleep(0.3)
+    server.reset()
+    client.predict(FEATURES)
+    print(f"{'cached prediction after its TTL':<34s} {server.calls:>16d} calls")
+    assert server.calls == 1
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+    Cold-load time of the delay analysis data: Excel parsing against the Parquet cache.
+
+    Each measure runs in a new Python process, as a new dashboard process
+    would, and times the load only (imports excluded).
+
+    Usage (from the streamlit folder):
+        python benchmarks/bench_load.py --runs 5
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOADERS = {
+    "read_excel": "import pandas as pd\nstart = time.perf_counter()\ndata = pd.read_excel(data_cache.SOURCE_PATH)",
+    "build_cache": "shutil.rmtree(data_cache.DATA_CACHE_DIR, ignore_errors=True)\nstart = time.perf_counter()\ndata, _ = data_cache.load_delay_data()",
+    "parquet_cache": "data_cache.load_delay_data()\nstart = time.perf_counter()\ndata, _ = data_cache.load_delay_data()",
+}
+
+
+def cold_load(loader, cache_dir):
+    code = (
+        "import json, shutil, time\nimport data_cache\n"
+        + LOADERS[loader]
+        + "\nprint(json.dumps({'seconds': time.perf_counter() - start, 'memory': int(data.memory_usage(deep=True).sum())}))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=APP_DIR, env=dict(os.environ, DATA_CACHE_DIR=cache_dir), capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for loader in LOADERS:
+            results = [cold_load(loader, cache_dir) for _ in range(args.runs)]
+            seconds = np.median([result["seconds"] for result in results])
+            print(f"{loader:15s} {seconds * 1000:9.1f} ms   {results[-1]['memory'] / 1e6:6.2f} MB in memory")
+
+
+if __name__ == "__main__":
+    main()
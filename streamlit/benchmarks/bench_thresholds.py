@@ -0,0 +1,94 @@
+"""
+    Threshold queries of the dashboard: ThresholdIndex against the DataFrame
+    scans of the former analyze_rentals_threshold.
+
+    Checks that both give the same figures for every threshold from -60 to
+    780 minutes (and a few fractional ones), then times one query of each.
+
+    Usage (from the streamlit folder):
+        python benchmarks/bench_thresholds.py
+"""
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_cache import load_delay_data
+from thresholds import ThresholdIndex
+
+
+def analyze_rentals_threshold(data, threshold):
+    """
+        Former implementation of the dashboard, one scan of the data per query.
+    """
+    affected_rentals = data[data['time_delta_with_previous_rental_in_minutes'] < threshold]
+    affected_rentals_connect = affected_rentals[affected_rentals['checkin_type'] == 'connect']
+    affected_rentals_mobile = affected_rentals[affected_rentals['checkin_type'] == 'mobile']
+    total_rentals_connect = (data['checkin_type'] == 'connect').sum()
+    total_rentals_mobile = (data['checkin_type'] == 'mobile').sum()
+    percentage_affected_connect = (len(affected_rentals_connect) / total_rentals_connect * 100) if total_rentals_connect > 0 else 0
+    percentage_affected_mobile = (len(affected_rentals_mobile) / total_rentals_mobile * 100) if total_rentals_mobile > 0 else 0
+    problem_cases_resolved_connect = affected_rentals_connect[affected_rentals_connect['delay_at_checkout_in_minutes'] > 0]
+    problem_cases_resolved_mobile = affected_rentals_mobile[affected_rentals_mobile['delay_at_checkout_in_minutes'] > 0]
+    return {
+        "threshold": threshold,
+        "total_rentals_connect": int(total_rentals_connect),
+        "affected_rentals_connect": len(affected_rentals_connect),
+        "percentage_affected_connect": percentage_affected_connect,
+        "problem_cases_resolved_connect": len(problem_cases_resolved_connect),
+        "total_rentals_mobile": int(total_rentals_mobile),
+        "affected_rentals_mobile": len(affected_rentals_mobile),
+        "percentage_affected_mobile": percentage_affected_mobile,
+        "problem_cases_resolved_mobile": len(problem_cases_resolved_mobile),
+    }
+
+
+def timed(function, repeats):
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start_time)
+    return float(np.median(timings))
+
+
+def main():
+    data, _ = load_delay_data()
+
+    start_time = time.perf_counter()
+    index = ThresholdIndex(data)
+    build_time = time.perf_counter() - start_time
+
+    thresholds = list(range(-60, 781)) + [0.5, 29.9, 30.1, 719.5]
+    mismatches = [threshold for threshold in thresholds if index.analyze(threshold) != analyze_rentals_threshold(data, threshold)]
+    if mismatches:
+        raise SystemExit(f"Results differ for thresholds {mismatches[:10]}")
+    print(f"Same results for {len(thresholds)} thresholds on {len(data)} rentals")
+
+    scan_time = timed(lambda: analyze_rentals_threshold(data, 60), 50)
+    index_time = timed(lambda: index.analyze(60), 1000)
+    print(f"index build   {build_time * 1000:8.2f} ms (once per dataset)")
+    print(f"scan query    {scan_time * 1000:8.2f} ms")
+    print(f"index query   {index_time * 1000:8.3f} ms   ({scan_time / index_time:.0f}x)")
+
+    # Sweep: every minute from 0 to 720, all scopes in one pass
+    sweep = index.sweep(np.arange(0, 721)).set_index(["scope", "threshold"])
+    for threshold in range(0, 721):
+        expected = analyze_rentals_threshold(data, threshold)
+        for checkin_type in ["connect", "mobile"]:
+            row = sweep.loc[(checkin_type, threshold)]
+            if (
+                row["affected_rentals"] != expected[f"affected_rentals_{checkin_type}"]
+                or row["percentage_affected"] != expected[f"percentage_affected_{checkin_type}"]
+                or row["problem_cases_resolved"] != expected[f"problem_cases_resolved_{checkin_type}"]
+            ):
+                raise SystemExit(f"Sweep differs at {threshold} minutes for {checkin_type}")
+    sweep_time = timed(lambda: index.sweep(np.arange(0, 721)), 50)
+    print(f"sweep 0-720   {sweep_time * 1000:8.3f} ms   (721 scan queries: {scan_time * 721 * 1000:.0f} ms)")
+
+
+if __name__ == "__main__":
+    main()
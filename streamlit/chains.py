@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+
+# ---------------- Rental chains ----------------
+def follow(parent, weight):
+    """
+        Pointer doubling along parent links (parent[i] == i at the end of a
+        link): the last node reached from every node and the sum of the
+        weights on the way, in log2(longest path) vectorized passes.
+    """
+    ancestor = parent.copy()
+    total = weight.astype(np.int64)
+    for _ in range(max(1, len(parent)).bit_length() + 1):
+        next_ancestor = ancestor[ancestor]
+        if np.array_equal(next_ancestor, ancestor):
+            break
+        total = total + total[ancestor]
+        ancestor = next_ancestor
+    return ancestor, total
+
+
+def build_chains(data):
+    """
+        Join every rental to the previous rental of the same car and follow
+        the chains of consecutive rentals.
+
+        The previous rental is found through a hash index on rental_id (one
+        vectorized lookup for all the rentals). The planned buffer between the
+        two rentals is time_delta_with_previous_rental_in_minutes: the late
+        return of the previous rental first uses this buffer, then makes the
+        next driver wait. Chains are followed by pointer doubling, so the
+        number of passes grows with the log of the longest chain, not with
+        the number of rentals. A chain can branch: a cancelled rental and the
+        rental that replaced it both follow the same previous rental.
+
+        Returns one row per rental, in the order of the data:
+        - chain_id, chain_position: first rental of the chain and rank in it
+        - previous_delay: delay at checkout of the previous rental (NaN when unknown)
+        - buffer_used: minutes of the buffer used by that delay
+        - wait_minutes: minutes the driver waited for the car
+        - impacted: the driver waited for the car
+        - cascade_length: number of consecutive impacted rentals ending with this one
+        - cascade: the previous rental was itself impacted, the wait cascaded
+    """
+    rental_ids = data["rental_id"].to_numpy()
+    delays = data["delay_at_checkout_in_minutes"].to_numpy(np.float64)
+    buffers = data["time_delta_with_previous_rental_in_minutes"].to_numpy(np.float64)
+    n_rentals = len(data)
+    rows = np.arange(n_rentals)
+
+    # Self-join: row of the previous rental, -1 when there is none or it is not in the data
+    previous_ids = data["previous_ended_rental_id"].to_numpy(np.float64)
+    has_previous = ~np.isnan(previous_ids)
+    previous = np.full(n_rentals, -1, dtype=np.int64)
+    previous[has_previous] = pd.Index(rental_ids).get_indexer(previous_ids[has_previous].astype(rental_ids.dtype))
+
+    linked = previous >= 0
+    previous_delay = np.full(n_rentals, np.nan)
+    previous_delay[linked] = delays[previous[linked]]
+    late = np.nan_to_num(np.maximum(previous_delay, 0))
+    buffer_used = np.where(linked, np.minimum(late, np.nan_to_num(buffers)), np.nan)
+    wait_minutes = np.where(linked, np.maximum(late - np.nan_to_num(buffers), 0), np.nan)
+    impacted = np.nan_to_num(wait_minutes) > 0
+
+    # First rental of each chain and distance to it
+    ancestor, position = follow(np.where(linked, previous, rows), linked)
+
+    # Consecutive impacted rentals up the chain (a first rental is never impacted)
+    _, cascade_length = follow(np.where(impacted, previous, rows), impacted)
+
+    return pd.DataFrame({
+        "rental_id": rental_ids,
+        "car_id": data["car_id"].to_numpy(),
+        "checkin_type": data["checkin_type"].to_numpy(),
+        "state": data["state"].to_numpy(),
+        "chain_id": rental_ids[ancestor],
+        "chain_position": position,
+        "previous_rental_id": np.where(linked, rental_ids[np.maximum(previous, 0)], -1),
+        "previous_delay": previous_delay,
+        "buffer": np.where(linked, buffers, np.nan),
+        "buffer_used": buffer_used,
+        "wait_minutes": wait_minutes,
+        "impacted": impacted,
+        "cascade_length": cascade_length,
+        "cascade": cascade_length >= 2,
+    }, index=data.index)
+
+
+def chain_summary(chains):
+    """
+        Figures of the impact of late returns on the next driver.
+    """
+    linked = chains["previous_rental_id"] >= 0
+    known = linked & chains["previous_delay"].notna()
+    impacted = chains[chains["impacted"]]
+    chain_sizes = chains.groupby("chain_id").size()
+    return {
+        "rentals_with_previous": int(linked.sum()),
+        "previous_delay_known": int(known.sum()),
+        "buffer_used": int((chains["buffer_used"] > 0).sum()),
+        "impacted": int(len(impacted)),
+        "percentage_impacted": float(len(impacted) / known.sum() * 100) if known.sum() > 0 else 0.0,
+        "median_wait_minutes": float(impacted["wait_minutes"].median()) if len(impacted) else 0.0,
+        "impacted_canceled": int((impacted["state"] == "canceled").sum()),
+        "impacted_by_checkin_type": impacted["checkin_type"].value_counts().to_dict(),
+        "cascades": int(chains["cascade"].sum()),
+        "longest_cascade": int(chains["cascade_length"].max()) if len(chains) else 0,
+        "longest_chain": int(chain_sizes.max()) if len(chain_sizes) else 0,
+    }
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+# Delay analysis data, as exported
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "get_around_delay_analysis.xlsx")
+
+# Folder of the Parquet copy of the data
+DATA_CACHE_DIR = os.getenv("DATA_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "data_cache"))
+
+# Bumped when the conversion changes, so old caches are rebuilt
+CACHE_FORMAT = 1
+
+# Compact dtypes of the delay data
+DTYPES = {
+    "rental_id": "int32",
+    "car_id": "int32",
+    "checkin_type": "category",
+    "state": "category",
+    # Whole minutes: exact in float32, NaN when missing
+    "delay_at_checkout_in_minutes": "float32",
+    "time_delta_with_previous_rental_in_minutes": "float32",
+    # Ids can exceed float32 precision
+    "previous_ended_rental_id": "float64",
+}
+
+
+# ---------------- Conversion ----------------
+def compact_dtypes(data):
+    """
+        Convert the columns to the compact dtypes, keeping a column as it is
+        when the conversion would change a value.
+    """
+    data = data.copy()
+    for column, dtype in DTYPES.items():
+        converted = data[column].astype(dtype)
+        if dtype != "category" and not np.array_equal(converted.to_numpy(np.float64), data[column].to_numpy(np.float64), equal_nan=True):
+            continue
+        data[column] = converted
+    return data
+
+
+def file_hash(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_version(source=SOURCE_PATH):
+    """
+        Cheap version of the source file (modification time and size), to key caches on.
+    """
+    stat = os.stat(source)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _cache_paths(source, cache_dir):
+    name = os.path.splitext(os.path.basename(source))[0]
+    return os.path.join(cache_dir, f"{name}.parquet"), os.path.join(cache_dir, f"{name}.json")
+
+
+def _read_meta(meta_path):
+    try:
+        with open(meta_path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_atomic(path, write):
+    # Replaced in one step, never read half-written
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp-", dir=os.path.dirname(path))
+    os.close(fd)
+    try:
+        write(tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+def _write_meta(meta_path, meta):
+    def write(path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+    _write_atomic(meta_path, write)
+
+
+def build_cache(source=SOURCE_PATH, cache_dir=None, digest=None):
+    """
+        Parse the Excel file once and store it as Parquet with the compact dtypes.
+    """
+    cache_dir = cache_dir or DATA_CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+    parquet_path, meta_path = _cache_paths(source, cache_dir)
+    data = compact_dtypes(pd.read_excel(source))
+    mtime_ns, size = source_version(source)
+    meta = {
+        "format": CACHE_FORMAT,
+        "source": os.path.basename(source),
+        "source_mtime_ns": mtime_ns,
+        "source_size": size,
+        "source_sha256": digest or file_hash(source),
+        "rows": len(data),
+    }
+    _write_atomic(parquet_path, lambda path: data.to_parquet(path, index=False))
+    _write_meta(meta_path, meta)
+    return data, meta
+
+
+def load_delay_data(source=SOURCE_PATH, cache_dir=None):
+    """
+        Delay analysis data, from the Parquet cache when it is up to date.
+
+        The cache is up to date when the source has the modification time and
+        size recorded with it. When only the modification time changed (file
+        copied, touched) the content hash decides, so an unchanged file is
+        not parsed again. Returns the data and the metadata of the cache.
+    """
+    cache_dir = cache_dir or DATA_CACHE_DIR
+    parquet_path, meta_path = _cache_paths(source, cache_dir)
+    meta = _read_meta(meta_path)
+    if meta is not None and meta.get("format") == CACHE_FORMAT and os.path.exists(parquet_path):
+        mtime_ns, size = source_version(source)
+        if (meta["source_mtime_ns"], meta["source_size"]) == (mtime_ns, size):
+            return pd.read_parquet(parquet_path), meta
+        digest = file_hash(source)
+        if meta["source_sha256"] == digest:
+            meta = dict(meta, source_mtime_ns=mtime_ns, source_size=size)
+            _write_meta(meta_path, meta)
+            return pd.read_parquet(parquet_path), meta
+        return build_cache(source, cache_dir, digest)
+    return build_cache(source, cache_dir)
@@ -0,0 +1,157 @@
+"""
+    Daily price of the cars of the delay data, used to estimate the revenue share affected by a threshold.
+
+    The delay data only has a car_id: the cars must be described in a
+    separate file (CSV or Parquet) with a car_id column and either
+    - a price column, the daily price of the car, used as is, or
+    - the features of the pricing model (FEATURE_COLUMNS), priced in bulk
+      with the logged pipeline (--model-uri) or with the /predict/batch
+      endpoint of the API (--api-url, one call per batch of rows).
+    The prices are written to car_prices.parquet, read by the dashboard.
+    Without this file, or when a car of an ended rental has no price, the
+    dashboard shows the share of the rentals affected instead.
+
+    Usage (from the streamlit folder):
+        python revenue.py --cars cars.csv
+        python revenue.py --cars cars.csv --model-uri models:/get_around_price_prediction/latest
+        python revenue.py --cars cars.csv --api-url https://andrianiniaina-api-space-1f33d3f.hf.space
+"""
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+
+# Prices of the cars, read by the dashboard
+CAR_PRICES_PATH = os.getenv("CAR_PRICES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "car_prices.parquet"))
+
+# Features of the pricing model
+FEATURE_COLUMNS = [
+    "model_key", "mileage", "engine_power", "fuel", "paint_color", "car_type",
+    "private_parking_available", "has_gps", "has_air_conditioning", "automatic_car",
+    "has_getaround_connect", "has_speed_regulator", "winter_tires",
+]
+
+# Rows per call of /predict/batch (MAX_BATCH_SIZE of the API)
+BATCH_SIZE = 10000
+
+
+# ---------------- Pricing ----------------
+def read_cars(path):
+    """
+        Cars described by car_id, one row per car, from a CSV or Parquet file.
+    """
+    cars = pd.read_parquet(path) if path.lower().endswith(".parquet") else pd.read_csv(path)
+    if "car_id" not in cars.columns:
+        raise ValueError(f"No car_id column in {path}")
+    duplicated = cars["car_id"][cars["car_id"].duplicated()].unique()
+    if len(duplicated):
+        raise ValueError(f"Cars described more than once in {path}: {list(duplicated[:10])}")
+    return cars
+
+
+def score_with_model(cars, model_uri):
+    """
+        One vectorized prediction of the logged pipeline for all the cars.
+    """
+    import mlflow.sklearn
+
+    return mlflow.sklearn.load_model(model_uri).predict(cars[FEATURE_COLUMNS])
+
+
+def score_with_api(cars, api_url, batch_size=BATCH_SIZE):
+    """
+        Cars priced by the API, batch_size rows per call of /predict/batch.
+    """
+    from api_client import CONNECT_TIMEOUT, PricingClient
+
+    client = PricingClient(api_url, timeout=(CONNECT_TIMEOUT, 120), cache_size=0)
+    try:
+        prices = client.predict_batch(cars[FEATURE_COLUMNS].to_dict(orient="records"), batch_size=batch_size)
+    finally:
+        client.close()
+    return np.array(prices, dtype=np.float64)
+
+
+def price_cars(cars, score=None):
+    """
+        Daily price of each car: its price column, or its features scored with score.
+    """
+    if score is None:
+        if "price" not in cars.columns:
+            raise ValueError("The cars have no price column: give --model-uri or --api-url to price their features")
+        prices = cars["price"].to_numpy(np.float64)
+    else:
+        missing_columns = [column for column in FEATURE_COLUMNS if column not in cars.columns]
+        if missing_columns:
+            raise ValueError(f"Missing feature columns: {', '.join(missing_columns)}")
+        prices = np.asarray(score(cars.reset_index(drop=True)), dtype=np.float64)
+    return pd.DataFrame({"car_id": cars["car_id"].to_numpy(), "price": prices})
+
+
+# ---------------- Dashboard ----------------
+def prices_version(path=CAR_PRICES_PATH):
+    """
+        Modification time and size of the prices, None when the cars were not priced.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def load_car_prices(path=CAR_PRICES_PATH):
+    return pd.read_parquet(path) if os.path.exists(path) else None
+
+
+def rental_revenue(data, car_prices):
+    """
+        Estimated revenue of each rental: the daily price of the car for an
+        ended rental (the rental duration is not in the data), nothing for a
+        canceled one. None when a car of an ended rental has no price: the
+        revenue share would then only cover part of the rentals.
+    """
+    prices = data["car_id"].map(car_prices.set_index("car_id")["price"]).to_numpy(np.float64)
+    ended = data["state"].to_numpy() == "ended"
+    if np.isnan(prices[ended]).any():
+        return None
+    return np.where(ended, prices, 0.0)
+
+
+def main():
+    from data_cache import load_delay_data
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cars", required=True, help="Cars of the delay data: car_id and price, or car_id and the features (CSV or Parquet)")
+    scorer = parser.add_mutually_exclusive_group()
+    scorer.add_argument("--model-uri", help="Logged pricing pipeline")
+    scorer.add_argument("--api-url", help="Base URL of the pricing API")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--output", default=CAR_PRICES_PATH)
+    args = parser.parse_args()
+
+    if args.model_uri:
+        score = lambda cars: score_with_model(cars, args.model_uri)
+    elif args.api_url:
+        score = lambda cars: score_with_api(cars, args.api_url, args.batch_size)
+    else:
+        score = None
+    try:
+        car_prices = price_cars(read_cars(args.cars), score)
+    except ValueError as e:
+        parser.error(str(e))
+
+    data, _ = load_delay_data()
+    ended_cars = data.loc[data["state"] == "ended", "car_id"].unique()
+    unpriced = np.setdiff1d(ended_cars, car_prices["car_id"].to_numpy())
+    car_prices.to_parquet(args.output, index=False)
+    print(f"{len(car_prices)} cars priced, median {car_prices['price'].median():.2f} per day: {args.output}")
+    if len(unpriced):
+        print(f"{len(unpriced)} of the {len(ended_cars)} cars of ended rentals have no price: "
+              "the dashboard shows the share of the rentals affected until every one is priced")
+
+
+if __name__ == "__main__":
+    main()
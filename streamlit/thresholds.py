@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+
+CHECKIN_TYPES = ("connect", "mobile")
+
+# Scopes of the feature in the threshold sweep: one check-in type or all the rentals
+SCOPES = CHECKIN_TYPES + ("all",)
+
+
+# ---------------- Threshold index ----------------
+class ThresholdIndex:
+    """
+        Answers "what does a minimum delay of threshold minutes between two
+        rentals change" without scanning the rentals.
+
+        For each check-in type, the time deltas with the previous rental are
+        sorted once, along with the cumulative count of the rentals returned
+        late (delay at checkout > 0). The rentals affected by a threshold are
+        the ones with a delta below it: a binary search gives their number and
+        the cumulative count the problem cases among them.
+
+        With the estimated revenue of each rental, the cumulative revenue is
+        kept the same way and gives the share of the revenue affected.
+    """
+
+    def __init__(self, data, revenue=None):
+        self.totals = {}
+        self.deltas = {}
+        self.problems = {}
+        self.revenue_totals = {}
+        self.revenue = {}
+        checkin_types = data["checkin_type"].to_numpy()
+        if revenue is not None:
+            revenue = np.asarray(revenue, dtype=np.float64)
+        deltas = data["time_delta_with_previous_rental_in_minutes"].to_numpy(np.float64)
+        late = data["delay_at_checkout_in_minutes"].to_numpy(np.float64) > 0
+        for checkin_type in CHECKIN_TYPES:
+            rows = checkin_types == checkin_type
+            self.totals[checkin_type] = int(rows.sum())
+            # Rentals without a previous rental (NaN delta) are never affected
+            rows &= ~np.isnan(deltas)
+            order = np.argsort(deltas[rows], kind="stable")
+            self.deltas[checkin_type] = deltas[rows][order]
+            self.problems[checkin_type] = np.concatenate([[0], np.cumsum(late[rows][order])])
+            if revenue is not None:
+                self.revenue_totals[checkin_type] = float(revenue[checkin_types == checkin_type].sum())
+                self.revenue[checkin_type] = np.concatenate([[0], np.cumsum(revenue[rows][order])])
+
+    def affected(self, checkin_type, threshold):
+        """
+            Rentals of the check-in type with less than threshold minutes since the previous rental.
+        """
+        return int(np.searchsorted(self.deltas[checkin_type], threshold, side="left"))
+
+    def problems_resolved(self, checkin_type, threshold):
+        """
+            Affected rentals whose car was returned late.
+        """
+        return int(self.problems[checkin_type][self.affected(checkin_type, threshold)])
+
+    def analyze(self, threshold):
+        """
+            Same figures as the dashboard's analyze_rentals_threshold, as counts.
+        """
+        result = {"threshold": threshold}
+        for checkin_type in CHECKIN_TYPES:
+            total = self.totals[checkin_type]
+            affected = self.affected(checkin_type, threshold)
+            result[f"total_rentals_{checkin_type}"] = total
+            result[f"affected_rentals_{checkin_type}"] = affected
+            result[f"percentage_affected_{checkin_type}"] = (affected / total * 100) if total > 0 else 0
+            result[f"problem_cases_resolved_{checkin_type}"] = self.problems_resolved(checkin_type, threshold)
+            if self.revenue:
+                result[f"percentage_revenue_affected_{checkin_type}"] = self.revenue_share(checkin_type, affected)
+        return result
+
+    def revenue_share(self, checkin_type, affected):
+        """
+            Percentage of the revenue of the check-in type earned by its first affected rentals.
+        """
+        total = self.revenue_totals[checkin_type]
+        return (self.revenue[checkin_type][affected] / total * 100) if total > 0 else 0
+
+    def sweep(self, thresholds):
+        """
+            Figures for every threshold and scope at once: one vectorized
+            binary search per check-in type. Returns one row per threshold
+            and scope (connect, mobile, all), with the share of the revenue
+            affected when the index has the revenue.
+        """
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        affected = {
+            checkin_type: np.searchsorted(self.deltas[checkin_type], thresholds, side="left")
+            for checkin_type in CHECKIN_TYPES
+        }
+        problems = {checkin_type: self.problems[checkin_type][affected[checkin_type]] for checkin_type in CHECKIN_TYPES}
+        totals = dict(self.totals)
+        revenue = {checkin_type: self.revenue[checkin_type][affected[checkin_type]] for checkin_type in self.revenue}
+        revenue_totals = dict(self.revenue_totals)
+        if revenue:
+            revenue["all"] = sum(revenue[checkin_type] for checkin_type in CHECKIN_TYPES)
+            revenue_totals["all"] = sum(revenue_totals[checkin_type] for checkin_type in CHECKIN_TYPES)
+        affected["all"] = sum(affected[checkin_type] for checkin_type in CHECKIN_TYPES)
+        problems["all"] = sum(problems[checkin_type] for checkin_type in CHECKIN_TYPES)
+        totals["all"] = sum(totals[checkin_type] for checkin_type in CHECKIN_TYPES)
+
+        frames = []
+        for scope in SCOPES:
+            frame = pd.DataFrame({
+                "threshold": thresholds,
+                "scope": scope,
+                "affected_rentals": affected[scope],
+                "percentage_affected": affected[scope] / totals[scope] * 100 if totals[scope] > 0 else 0.0,
+                "problem_cases_resolved": problems[scope],
+            })
+            if revenue:
+                frame["percentage_revenue_affected"] = revenue[scope] / revenue_totals[scope] * 100 if revenue_totals[scope] > 0 else 0.0
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+